@@ -1,50 +1,217 @@
+import math
 import random
 import time
 
+import config
+from ordering import MoveOrdering
+from parallel import SearchPool, search_minimax_action, search_max_n_action
+from stats import SearchStats
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+
+class SearchTimeout(Exception):
+    pass
+
 
 class Agent:
     ident = 0
+    nodes = 0
+    leaves = 0
+    depth = 0
+    deadline = None
+    interrupt = None
+    stats = None
+    pondering = False
+    games = 0
 
     def __init__(self):
         self.id = Agent.ident
         Agent.ident += 1
 
     @classmethod
-    def get_chosen_action(cls, state, max_depth):
+    def get_chosen_action(cls, state, max_depth, max_think_time=0):
+        pass
+
+    @classmethod
+    def new_game(cls):
+        # tables and move ordering are kept between moves of one game only
+        cls.games += 1
+        for table in cls.__dict__.get('tables', {}).values():
+            table.clear()
+        if hasattr(cls, 'ordering'):
+            cls.ordering.clear()
+
+    @classmethod
+    def start_search(cls, max_think_time=0):
+        cls.nodes = 0
+        cls.leaves = 0
+        cls.depth = 0
+        cls.stats = SearchStats()
+        cls.start_clock(max_think_time)
+
+    @classmethod
+    def finish_search(cls, action, table=None):
+        # fills the stats record of this move, table and ordering count per search
+        stats = cls.stats
+        stats.nodes = cls.nodes
+        stats.leaves = cls.leaves
+        stats.depth = cls.depth
+        if table is not None:
+            stats.tt_probes += table.probes
+            stats.tt_hits += table.hits
+        if hasattr(cls, 'ordering'):
+            stats.cutoffs = sum(cls.ordering.cutoffs.values())
+        if 'worker_nodes' in cls.__dict__:
+            stats.worker_nodes = dict(cls.worker_nodes)
+        stats.finish()
+        return action
+
+    @classmethod
+    def start_clock(cls, max_think_time):
+        # leave part of the budget as a margin before the game stops the agent
+        if max_think_time:
+            cls.deadline = time.perf_counter() + max_think_time * config.TIME_BUDGET_FRACTION
+        else:
+            cls.deadline = None
+
+    @classmethod
+    def check_clock(cls):
+        if cls.deadline is not None and time.perf_counter() > cls.deadline:
+            raise SearchTimeout()
+        if cls.interrupt is not None and cls.interrupt():
+            raise SearchTimeout()
+
+    @classmethod
+    def ponder(cls, state, player, interrupt):
+        # deepening search of a position before the agent's turn, only to fill its tables;
+        # runs until interrupt() returns True or the game horizon is searched
+        if not cls.pondering:
+            return
+        cls.deadline = None
+        cls.interrupt = interrupt
+        try:
+            for depth in range(1, cls.get_horizon(state) + 1):
+                cls.ponder_search(state.copy(), depth, player)
+        except SearchTimeout:
+            pass
+        finally:
+            cls.interrupt = None
+
+    @classmethod
+    def ponder_search(cls, state, depth, player):
         pass
 
+    @staticmethod
+    def get_horizon(state):
+        return (state.get_max_rounds() - state.get_current_round()) * state.get_num_of_players() - \
+            state.get_on_move_ord()
+
+    @classmethod
+    def iterative_deepening(cls, state, max_depth, search):
+        # without a deadline search up to max_depth, with one go as deep as time allows;
+        # every iteration orders moves by the transposition table filled by the previous one;
+        # a timed out search leaves its moves applied on state, so the fallback is taken before
+        fallback_action = state.get_legal_actions()[-1]
+        best_action = None
+        last_depth = max_depth if cls.deadline is None else cls.get_horizon(state)
+        for depth in range(1, max(1, min(last_depth, cls.get_horizon(state))) + 1):
+            try:
+                score, action = cls.run_iteration(state, depth, search)
+            except SearchTimeout:
+                break
+            best_action = action
+        return fallback_action if best_action is None else best_action
+
+    @classmethod
+    def run_iteration(cls, state, depth, search):
+        nodes, start_time = cls.nodes, time.perf_counter()
+        result = search(state, depth)
+        cls.depth = depth
+        cls.stats.add_iteration(depth, cls.nodes - nodes, time.perf_counter() - start_time)
+        return result
+
+    @classmethod
+    def add_worker_counters(cls, counters, worker):
+        # counters of a task searched in SearchPool
+        nodes, leaves, probes, hits, cutoffs = counters
+        cls.nodes += nodes
+        cls.leaves += leaves
+        cls.stats.tt_probes += probes
+        cls.stats.tt_hits += hits
+        for source, count in cutoffs.items():
+            cls.ordering.cutoffs[source] += count
+        cls.worker_nodes[worker] = cls.worker_nodes.get(worker, 0) + nodes
+
+    @staticmethod
+    def order_actions(actions, first_action):
+        if first_action is None or first_action == actions[0]:
+            return actions
+        return [first_action] + [action for action in actions if action != first_action]
+
+    @classmethod
+    def get_table(cls, player=None):
+        # one table per agent class and per point of view, kept between moves
+        if 'tables' not in cls.__dict__:
+            cls.tables = {}
+        if player not in cls.tables:
+            cls.tables[player] = TranspositionTable()
+        return cls.tables[player]
+
 
 class RandomAgent(Agent):
-    def get_chosen_action(cls, state, max_depth):
-        time.sleep(0.5)
+    def get_chosen_action(cls, state, max_depth, max_think_time=0):
+        cls.start_search()
         actions = state.get_legal_actions()
-        return actions[random.randint(0, len(actions) - 1)]
+        return cls.finish_search(actions[random.randint(0, len(actions) - 1)])
 
 
 class GreedyAgent(Agent):
-    def get_chosen_action(cls, state, max_depth):
-        time.sleep(0.5)
+    def get_chosen_action(cls, state, max_depth, max_think_time=0):
+        cls.start_search()
         actions = state.get_legal_actions()
+        cls.nodes = cls.leaves = len(actions)
         best_score, best_action = None, None
+        player = state.get_on_move_chr()
+        state = state.copy()
         for action in actions:
-            new_state = state.generate_successor_state(action)
-            score = new_state.get_score(state.get_on_move_chr())
+            state.apply(action)
+            score = state.get_score(player)
+            state.undo()
             if (best_score is None and best_action is None) or score > best_score:
                 best_action = action
                 best_score = score
-        return best_action
+        return cls.finish_search(best_action)
 
 class MaxNAgent(Agent):
-    def get_chosen_action(cls, state, max_depth):
-        time.sleep(0.5)
-        score, action = cls.max_n(state, max_depth)
-        return action
+    pondering = True
+
+    def get_chosen_action(cls, state, max_depth, max_think_time=0):
+        cls.start_search(max_think_time)
+        cls.get_table().new_search()
+        if cls.deadline is None:
+            score, action = cls.run_iteration(state.copy(), max_depth, cls.max_n)
+            return cls.finish_search(action, cls.get_table())
+        return cls.finish_search(cls.iterative_deepening(state.copy(), max_depth, cls.max_n), cls.get_table())
+
+    @classmethod
+    def ponder_search(cls, state, depth, player):
+        cls.get_table()
+        cls.max_n(state, depth)
 
     @classmethod
     def max_n(cls, state, depth):
+        cls.nodes += 1
+        if not cls.nodes & 255:
+            cls.check_clock()
         if depth == 0 or state.is_goal_state():
+            cls.leaves += 1
             return state.get_scores(), None
 
+        table = cls.tables[None]
+        entry = table.probe(state.get_zobrist_key())
+        if entry is not None and entry[1] >= depth:
+            return entry[2], entry[4]
+
         best_score, best_action = None, None
 
         player = state.get_on_move_chr()
@@ -53,25 +220,32 @@ class MaxNAgent(Agent):
         if not actions:
             return state.get_scores(), None
 
+        if entry is not None:
+            actions = cls.order_actions(actions, entry[4])
+
         for action in actions:
-            new_state = state.generate_successor_state(action)
-            score, move = cls.max_n(new_state, depth - 1)
+            state.apply(action)
+            score, move = cls.max_n(state, depth - 1)
+            state.undo()
 
             if best_score is None or score[player] > best_score[player]:
                 best_score = score
                 best_action = action
 
+        table.store(state.get_zobrist_key(), depth, best_score, EXACT, best_action)
         return best_score, best_action
 
 class MinimaxAgent(Agent):
-    def get_chosen_action(cls, state, max_depth):
-        time.sleep(0.5)
-        score, action = cls.minimax(state, max_depth, state.get_on_move_chr())
-        return action
+    def get_chosen_action(cls, state, max_depth, max_think_time=0):
+        cls.start_search()
+        player = state.get_on_move_chr()
+        cls.get_table(player).new_search()
+        score, action = cls.run_iteration(state.copy(), max_depth, lambda s, d: cls.minimax(s, d, player))
+        return cls.finish_search(action, cls.get_table(player))
 
     @classmethod
     def get_opponents(cls, state, player):
-        return list(filter(lambda x: x != player, state.get_scores().keys()))
+        return [kind for kind in config.SPACESHIP_KINDS[:state.get_num_of_players()] if kind != player]
 
     @classmethod
     def evaluate(cls, state, player):
@@ -79,9 +253,16 @@ class MinimaxAgent(Agent):
 
     @classmethod
     def minimax(cls, state, depth, player):
+        cls.nodes += 1
         if depth == 0 or state.is_goal_state():
+            cls.leaves += 1
             return cls.evaluate(state, player), None
 
+        table = cls.tables[player]
+        entry = table.probe(state.get_zobrist_key())
+        if entry is not None and entry[1] >= depth:
+            return entry[2], entry[4]
+
         if state.get_on_move_chr() == player:
             best_result = float("-inf")
             best_action = None
@@ -91,13 +272,15 @@ class MinimaxAgent(Agent):
                 return cls.evaluate(state, player), None
 
             for action in actions:
-                new_state = state.generate_successor_state(action)
-                result, move = cls.minimax(new_state, depth - 1, player)
+                state.apply(action)
+                result, move = cls.minimax(state, depth - 1, player)
+                state.undo()
 
                 if result > best_result:
                     best_result = result
                     best_action = action
 
+            table.store(state.get_zobrist_key(), depth, best_result, EXACT, best_action)
             return best_result, best_action
         else:
             best_result = float("+inf")
@@ -108,34 +291,75 @@ class MinimaxAgent(Agent):
                 return cls.evaluate(state, player), None
 
             for action in actions:
-                new_state = state.generate_successor_state(action)
-                result, move = cls.minimax(new_state, depth - 1, player)
+                state.apply(action)
+                result, move = cls.minimax(state, depth - 1, player)
+                state.undo()
 
                 if result < best_result:
                     best_result = result
                     best_action = action
 
+            table.store(state.get_zobrist_key(), depth, best_result, EXACT, best_action)
             return best_result, best_action
 
 class MinimaxABAgent(Agent):
-    def get_chosen_action(cls, state, max_depth):
-        time.sleep(0.5)
-        score, action = cls.minimax(state, max_depth, float("-inf"), float("+inf"), state.get_on_move_chr())
-        return action
+    ordering = MoveOrdering()
+    pondering = True
+
+    def get_chosen_action(cls, state, max_depth, max_think_time=0):
+        cls.start_search(max_think_time)
+        player = state.get_on_move_chr()
+        cls.get_table(player).new_search()
+        cls.ordering.new_search()
+        action = cls.iterative_deepening(state.copy(), max_depth,
+                                         lambda s, d: cls.minimax(s, d, float("-inf"), float("+inf"), player))
+        return cls.finish_search(action, cls.get_table(player))
+
+    @classmethod
+    def ponder_search(cls, state, depth, player):
+        cls.get_table(player)
+        cls.minimax(state, depth, float("-inf"), float("+inf"), player)
 
     @classmethod
     def get_opponents(cls, state, player):
-        return list(filter(lambda x: x != player, state.get_scores().keys()))
+        return [kind for kind in config.SPACESHIP_KINDS[:state.get_num_of_players()] if kind != player]
 
     @classmethod
     def evaluate(cls, state, player):
         return state.get_score(player) - state.get_score(cls.get_opponents(state, player)[0])
 
+    @staticmethod
+    def get_flag(result, alpha, beta):
+        if result <= alpha:
+            return UPPER_BOUND
+        if result >= beta:
+            return LOWER_BOUND
+        return EXACT
+
     @classmethod
     def minimax(cls, state, depth, alpha, beta, player):
+        cls.nodes += 1
+        if not cls.nodes & 255:
+            cls.check_clock()
         if depth == 0 or state.is_goal_state():
+            cls.leaves += 1
             return cls.evaluate(state, player), None
 
+        table = cls.tables[player]
+        entry = table.probe(state.get_zobrist_key())
+        tt_action = entry[4] if entry is not None else None
+        if entry is not None and entry[1] >= depth:
+            _, _, value, flag, action, _ = entry
+            if flag == EXACT:
+                return value, action
+            if flag == LOWER_BOUND:
+                alpha = max(alpha, value)
+            elif flag == UPPER_BOUND:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value, action
+        alpha_orig, beta_orig = alpha, beta
+
         if state.get_on_move_chr() == player:
             best_result = float("-inf")
             best_action = None
@@ -144,9 +368,10 @@ class MinimaxABAgent(Agent):
             if not actions:
                 return cls.evaluate(state, player), None
 
-            for action in actions:
-                new_state = state.generate_successor_state(action)
-                result, move = cls.minimax(new_state, depth - 1, alpha, beta, player)
+            for action, source in cls.ordering.order(state, actions, tt_action):
+                state.apply(action)
+                result, move = cls.minimax(state, depth - 1, alpha, beta, player)
+                state.undo()
 
                 if result > best_result:
                     best_result = result
@@ -154,8 +379,11 @@ class MinimaxABAgent(Agent):
 
                 alpha = max(alpha, best_result)
                 if alpha >= beta:
+                    cls.ordering.cutoff(state, action, source, depth)
                     break
 
+            table.store(state.get_zobrist_key(), depth, best_result,
+                        cls.get_flag(best_result, alpha_orig, beta_orig), best_action)
             return best_result, best_action
         else:
             best_result = float("+inf")
@@ -165,9 +393,10 @@ class MinimaxABAgent(Agent):
             if not actions:
                 return cls.evaluate(state, player), None
 
-            for action in actions:
-                new_state = state.generate_successor_state(action)
-                result, move = cls.minimax(new_state, depth - 1, alpha, beta, player)
+            for action, source in cls.ordering.order(state, actions, tt_action):
+                state.apply(action)
+                result, move = cls.minimax(state, depth - 1, alpha, beta, player)
+                state.undo()
 
                 if result < best_result:
                     best_result = result
@@ -175,6 +404,181 @@ class MinimaxABAgent(Agent):
 
                 beta = min(beta, best_result)
                 if alpha >= beta:
+                    cls.ordering.cutoff(state, action, source, depth)
+                    break
+
+            table.store(state.get_zobrist_key(), depth, best_result,
+                        cls.get_flag(best_result, alpha_orig, beta_orig), best_action)
+            return best_result, best_action
+
+
+class ParallelMinimaxABAgent(MinimaxABAgent):
+    # root actions are split over SearchPool, the best ordered one is searched first (young brothers wait)
+    young_brothers_wait = True
+    ordering = MoveOrdering()
+    pondering = False
+    searches = 0
+    root_values = {}
+    worker_nodes = {}
+
+    def get_chosen_action(cls, state, max_depth, max_think_time=0):
+        cls.start_search(max_think_time)
+        cls.worker_nodes = {}
+        cls.root_values = {}
+        cls.searches += 1
+        cls.ordering.new_search()
+        player = state.get_on_move_chr()
+        return cls.finish_search(cls.iterative_deepening(state.copy(), max_depth,
+                                                         lambda s, d: cls.split(s, d, player)))
+
+    @classmethod
+    def split(cls, state, depth, player):
+        # previous iteration's best first, sort is stable for actions without a value yet
+        actions = sorted(state.get_legal_actions(), key=lambda a: -cls.root_values.get(a, float('-inf')))
+        results = SearchPool.split(search_minimax_action, cls.__name__, (cls.games, cls.searches), state, actions,
+                                   depth, player, cls.deadline, cls.young_brothers_wait)
+        best_result, best_action = float('-inf'), None
+        for action, result, alpha, counters, worker in results:
+            cls.add_worker_counters(counters, worker)
+            if result is None:
+                raise SearchTimeout()
+            # a result not above the alpha it was searched with is only an upper bound
+            if result > alpha:
+                cls.root_values[action] = result
+                if result > best_result:
+                    best_result, best_action = result, action
+        return best_result, best_action
+
+
+class ParallelMaxNAgent(MaxNAgent):
+    # root actions are split over SearchPool, max-n has no bounds to share
+    pondering = False
+    searches = 0
+    worker_nodes = {}
+
+    def get_chosen_action(cls, state, max_depth, max_think_time=0):
+        cls.start_search(max_think_time)
+        cls.worker_nodes = {}
+        cls.searches += 1
+        if cls.deadline is None:
+            score, action = cls.run_iteration(state.copy(), max_depth, cls.split)
+            return cls.finish_search(action)
+        return cls.finish_search(cls.iterative_deepening(state.copy(), max_depth, cls.split))
+
+    @classmethod
+    def split(cls, state, depth):
+        player = state.get_on_move_chr()
+        results = SearchPool.split(search_max_n_action, cls.__name__, (cls.games, cls.searches), state,
+                                   state.get_legal_actions(), depth, player, cls.deadline, False)
+        best_score, best_action = None, None
+        for action, score, _, counters, worker in results:
+            cls.add_worker_counters(counters, worker)
+            if score is None:
+                raise SearchTimeout()
+            if best_score is None or score[player] > best_score[player]:
+                best_score, best_action = score, action
+        return best_score, best_action
+
+
+class MCTSNode:
+    __slots__ = ('action', 'parent', 'player', 'children', 'untried', 'visits', 'rewards')
+
+    def __init__(self, state, action=None, parent=None):
+        self.action = action
+        self.parent = parent
+        self.player = state.get_on_move_ord()
+        self.children = []
+        self.untried = list(state.get_legal_actions())
+        self.visits = 0
+        self.rewards = [0.] * state.get_num_of_players()
+
+    def select_child(self, exploration):
+        # UCT from the point of view of the player choosing at this node
+        log_visits = math.log(self.visits)
+        player = self.player
+        return max(self.children,
+                   key=lambda c: c.rewards[player] / c.visits + exploration * math.sqrt(log_visits / c.visits))
+
+
+class MCTSAgent(Agent):
+    # UCT over State with apply/undo playouts; runs a fixed number of playouts or until the time budget ends
+    exploration = config.MCTS_EXPLORATION
+    playouts = config.MCTS_PLAYOUTS
+    greedy_rate = config.MCTS_GREEDY_RATE
+    iterations = 0
+    iterations_per_sec = 0.
+
+    def get_chosen_action(cls, state, max_depth, max_think_time=0):
+        cls.start_search(max_think_time)
+        state = state.copy()
+        root = MCTSNode(state)
+        iterations = 0
+        start_time = time.perf_counter()
+        while True:
+            if cls.deadline is None:
+                if iterations >= cls.playouts:
                     break
+            elif iterations and time.perf_counter() > cls.deadline:
+                break
+            cls.iterate(state, root)
+            iterations += 1
+        elapsed = time.perf_counter() - start_time
+        cls.iterations = iterations
+        cls.iterations_per_sec = iterations / elapsed if elapsed else 0.
+        cls.stats.mcts_iterations = iterations
+        cls.stats.mcts_iterations_per_sec = cls.iterations_per_sec
+        # every playout ends in one evaluated goal state
+        cls.leaves = iterations
+        return cls.finish_search(max(root.children, key=lambda c: c.visits).action)
 
-            return best_result, best_action
\ No newline at end of file
+    @classmethod
+    def iterate(cls, state, root):
+        node, moves = root, 0
+        # selection
+        while not node.untried and node.children:
+            node = node.select_child(cls.exploration)
+            state.apply(node.action)
+            moves += 1
+        # expansion
+        if node.untried:
+            action = node.untried.pop(random.randrange(len(node.untried)))
+            state.apply(action)
+            moves += 1
+            child = MCTSNode(state, action, node)
+            node.children.append(child)
+            node = child
+        cls.nodes += moves
+        rewards = cls.rollout(state)
+        # back propagation
+        while node is not None:
+            node.visits += 1
+            for i, reward in enumerate(rewards):
+                node.rewards[i] += reward
+            node = node.parent
+        for _ in range(moves):
+            state.undo()
+
+    @classmethod
+    def rollout(cls, state):
+        moves = 0
+        while not state.is_goal_state():
+            actions = state.get_legal_actions()
+            if random.random() < cls.greedy_rate:
+                action = max(actions, key=state.get_action_gain)
+            else:
+                action = actions[random.randrange(len(actions))]
+            state.apply(action)
+            moves += 1
+        cls.nodes += moves
+        rewards = cls.get_rewards(state)
+        for _ in range(moves):
+            state.undo()
+        return rewards
+
+    @staticmethod
+    def get_rewards(state):
+        # win shared between all players with the best score
+        scores = list(state.get_scores().values())
+        best = max(scores)
+        winners = scores.count(best)
+        return [1. / winners if score == best else 0. for score in scores]
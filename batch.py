@@ -0,0 +1,205 @@
+"""
+BATCH SIMULATION
+Plays N games at once as NumPy arrays, for data generation and agent evaluation.
+Every game keeps one uint64 bitboard of colored tiles and one cell index per
+player, plus the player on move and the current round. All games advance one
+ply per step with vectorized move generation and coloring that follow the
+rules of State.get_legal_actions and State.generate_successor_state, so maps
+are limited to 64 cells.
+
+Candidate moves of a game are kept in 9 columns, in the order State lists them:
+4 full slides (up, right, down, left), 4 one tile moves, stay on tile.
+
+Usage:
+    python batch.py example_map.txt 5 10000 greedy
+"""
+import sys
+import time
+
+import numpy as np
+
+from geometry import DIRECTIONS
+
+NUM_OF_CANDIDATES = 9
+RANDOM = 'random'
+GREEDY = 'greedy'
+
+
+def popcount(bitboards):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int64)
+    x = bitboards - ((bitboards >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((x * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+
+def lowest_bit_index(bitboards):
+    # index of the lowest set bit, bitboards must not be 0
+    lowest = bitboards & (~bitboards + np.uint64(1))
+    return np.log2(lowest.astype(np.float64)).astype(np.int64)
+
+
+def highest_bit_index(bitboards):
+    # index of the highest set bit, bitboards must not be 0; float rounding may overshoot by one
+    idx = np.minimum(np.floor(np.log2(bitboards.astype(np.float64))).astype(np.int64), 63)
+    return idx - (np.left_shift(np.uint64(1), idx.astype(np.uint64)) > bitboards)
+
+
+class BatchTables:
+    def __init__(self, geometry):
+        if geometry.num_of_cells > 64:
+            raise Exception(f'Batch simulation supports maps up to 64 cells, not {geometry.num_of_cells}!')
+        cells = geometry.num_of_cells
+        self.rays = np.array(geometry.rays, dtype=np.uint64)
+        self.ray_ends = np.array(geometry.ray_ends, dtype=np.int64)
+        self.steps = geometry.steps
+        self.ascending = geometry.ascending
+        self.bits = np.left_shift(np.uint64(1), np.arange(cells, dtype=np.uint64))
+        # painted path of a move from src to dst, staying paints nothing
+        self.segments = np.zeros((cells, cells), dtype=np.uint64)
+        for src in range(cells):
+            for direction in DIRECTIONS:
+                dst = src
+                while dst != geometry.ray_ends[direction][src]:
+                    dst += geometry.steps[direction]
+                    self.segments[src, dst] = geometry.get_segment_mask(src, dst)
+        self.all_ones_mask = np.uint64(geometry.all_ones_mask)
+
+
+class BatchSimulator:
+    def __init__(self, state, num_of_games, seed=None):
+        self.geometry = state.geometry
+        self.tables = BatchTables(state.geometry)
+        self.num_of_games = num_of_games
+        self.num_of_players = state.get_num_of_players()
+        self.max_rounds = state.get_max_rounds()
+        self.rng = np.random.default_rng(seed)
+        self.games = np.arange(num_of_games)
+        kinds = list(state.get_scores())
+        self.positions = np.tile(np.array([state.get_state(kind).bit_length() - 1 for kind in kinds],
+                                          dtype=np.int64), (num_of_games, 1))
+        self.colors = np.tile(np.array([state.get_state(kind.lower()) for kind in kinds],
+                                       dtype=np.uint64), (num_of_games, 1))
+        self.abyss = np.uint64(state.get_state('0'))
+        self.on_move = np.full(num_of_games, state.get_on_move_ord(), dtype=np.int64)
+        self.current_round = np.full(num_of_games, state.get_current_round(), dtype=np.int64)
+        self.done = self.get_goal_mask()
+        self.plies = 0
+
+    def get_goal_mask(self):
+        occupied = np.bitwise_or.reduce(self.colors, axis=1) | self.abyss | \
+            np.bitwise_or.reduce(self.tables.bits[self.positions], axis=1)
+        return (occupied == self.tables.all_ones_mask) | (self.current_round == self.max_rounds)
+
+    def get_candidates(self):
+        # (games x 9) destination cells and the mask of the legal ones
+        tables = self.tables
+        position = self.positions[self.games, self.on_move]
+        obstacles = np.bitwise_or.reduce(tables.bits[self.positions], axis=1) | self.abyss
+        obstacles &= ~tables.bits[position]
+
+        candidates = np.empty((self.num_of_games, NUM_OF_CANDIDATES), dtype=np.int64)
+        legal = np.empty((self.num_of_games, NUM_OF_CANDIDATES), dtype=bool)
+        for direction in DIRECTIONS:
+            step = tables.steps[direction]
+            blockers = tables.rays[direction][position] & obstacles
+            blocked = blockers != 0
+            safe = np.where(blocked, blockers, np.uint64(1))
+            first = lowest_bit_index(safe) if tables.ascending[direction] else highest_bit_index(safe)
+            end = np.where(blocked, first - step, tables.ray_ends[direction][position])
+            candidates[:, direction] = end
+            legal[:, direction] = end != position
+            legal[:, 4 + direction] = legal[:, direction] & (end != position + step)
+            candidates[:, 4 + direction] = np.where(legal[:, 4 + direction], position + step, position)
+        candidates[:, 8] = position
+        legal[:, 8] = True
+        legal &= ~self.done[:, None]
+        return candidates, legal
+
+    def get_gains(self, candidates):
+        position = self.positions[self.games, self.on_move]
+        own = self.colors[self.games, self.on_move]
+        return popcount(self.tables.segments[position[:, None], candidates] & ~own[:, None])
+
+    def choose(self, candidates, legal, policy=RANDOM):
+        if policy == GREEDY:
+            # first action with the most painted tiles, as GreedyAgent picks it
+            score = np.where(legal, self.get_gains(candidates), -1)
+        else:
+            score = np.where(legal, self.rng.random(legal.shape), -1.)
+        return candidates[self.games, np.argmax(score, axis=1)]
+
+    def step(self, destinations):
+        active = ~self.done
+        player = self.on_move
+        position = self.positions[self.games, player]
+        destinations = np.where(active, destinations, position)
+        painted = self.tables.segments[position, destinations]
+        self.colors &= ~painted[:, None]
+        self.colors[self.games, player] |= painted
+        self.positions[self.games, player] = destinations
+        self.on_move = np.where(active, (player + 1) % self.num_of_players, player)
+        self.current_round += active & (self.on_move == 0)
+        self.done = self.get_goal_mask()
+        self.plies += int(active.sum())
+
+    def run(self, policy=RANDOM, history=None):
+        while not self.done.all():
+            candidates, legal = self.get_candidates()
+            destinations = self.choose(candidates, legal, policy)
+            if history is not None:
+                history.append((self.positions[self.games, self.on_move].copy(), destinations.copy(),
+                                candidates, legal, self.done.copy()))
+            self.step(destinations)
+        return self.get_scores()
+
+    def get_scores(self):
+        return popcount(self.colors)
+
+
+def check_parity(state, num_of_games=64, policy=RANDOM, seed=None):
+    # plays the batch and replays every game through State, returns a list of mismatches
+    simulator = BatchSimulator(state, num_of_games, seed)
+    history = []
+    simulator.run(policy, history)
+    cells = state.geometry.num_of_cells
+    mismatches = []
+    for game in range(num_of_games):
+        replay = state
+        legal_parity = True
+        for ply, (sources, destinations, candidates, legal, done) in enumerate(history):
+            if done[game]:
+                break
+            src = int(sources[game]) * cells
+            batch_actions = [src + int(dst) for dst in candidates[game][legal[game]]]
+            if batch_actions != replay.get_legal_actions():
+                mismatches.append(f'game {game}, ply {ply}: legal actions {batch_actions} '
+                                  f'instead of {replay.get_legal_actions()}')
+                legal_parity = False
+                break
+            replay = replay.generate_successor_state(src + int(destinations[game]))
+        # scores of every game that followed the rules, whichever ply it ended on
+        if legal_parity:
+            if list(replay.get_scores().values()) != list(simulator.get_scores()[game]):
+                mismatches.append(f'game {game}: scores {list(simulator.get_scores()[game])} '
+                                  f'instead of {list(replay.get_scores().values())}')
+    return mismatches
+
+
+if __name__ == '__main__':
+    from headless import load_state
+
+    map_filename = sys.argv[1] if len(sys.argv) > 1 else 'example_map.txt'
+    max_rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    num_of_games = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+    policy = sys.argv[4] if len(sys.argv) > 4 else RANDOM
+    initial_state = load_state(map_filename, max_rounds)
+    errors = check_parity(initial_state, 64, policy, seed=0)
+    print(f'Parity with State: {"OK" if not errors else errors[0]}')
+    batch = BatchSimulator(initial_state, num_of_games, seed=0)
+    start_time = time.perf_counter()
+    final_scores = batch.run(policy)
+    elapsed = time.perf_counter() - start_time
+    print(f'{num_of_games} games, {batch.plies} plies in {elapsed:.3f}s ({batch.plies / elapsed:.0f} plies/s)')
+    print(f'Mean scores: {final_scores.mean(axis=0)}')
@@ -0,0 +1,13 @@
+"""
+BENCHMARKS
+Measures the rules engine and the search agents on fixed, seeded positions
+taken from the bundled maps, so that runs on the same machine are comparable.
+
+Usage:
+    python -m benchmarks                              run and print
+    python -m benchmarks --save results.json          run and store results
+    python -m benchmarks --baseline results.json      run and compare to stored results
+"""
+from benchmarks.positions import get_positions
+from benchmarks.suite import run_suite
+from benchmarks.report import save_results, load_results, compare_results, format_results
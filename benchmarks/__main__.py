@@ -0,0 +1,23 @@
+import argparse
+import sys
+
+from benchmarks import run_suite, save_results, load_results, compare_results, format_results
+
+parser = argparse.ArgumentParser(prog='python -m benchmarks')
+parser.add_argument('--save', help='write results to this JSON file')
+parser.add_argument('--baseline', help='compare results to this JSON file')
+parser.add_argument('--threshold', type=float, default=0.1, help='allowed ns/op growth over the baseline')
+parser.add_argument('--no-memory', action='store_true', help='skip peak memory measurements')
+parser.add_argument('--seed', type=int, default=0, help='seed of the benchmark positions')
+args = parser.parse_args()
+
+results = run_suite(memory=not args.no_memory, seed=args.seed)
+baseline = load_results(args.baseline) if args.baseline else None
+print(format_results(results, baseline))
+if args.save:
+    save_results(results, args.save)
+if baseline:
+    regressions = compare_results(results, baseline, args.threshold)
+    if regressions:
+        print(f'Regressions over {args.threshold:.0%}: {", ".join(regressions)}')
+        sys.exit(1)
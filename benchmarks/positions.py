@@ -0,0 +1,22 @@
+import random
+
+from headless import load_state
+
+MAP_NAMES = ('example_map.txt', 'four_player_map.txt')
+
+
+def get_positions(map_name, count=32, max_plies=6, max_rounds=10, seed=0):
+    # initial state of the map and states reached by seeded random play from it
+    rng = random.Random(f'{map_name}:{seed}')
+    initial_state = load_state(map_name, max_rounds)
+    positions = [initial_state]
+    while len(positions) < count:
+        state = initial_state
+        for _ in range(rng.randint(1, max_plies)):
+            actions = state.get_legal_actions()
+            if not actions:
+                break
+            state = state.generate_successor_state(actions[rng.randrange(len(actions))])
+        if not state.is_goal_state():
+            positions.append(state)
+    return positions
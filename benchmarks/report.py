@@ -0,0 +1,39 @@
+import json
+import platform
+from datetime import datetime
+
+
+def save_results(results, path):
+    with open(path, 'w') as file:
+        json.dump({
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results
+        }, file, indent=2)
+
+
+def load_results(path):
+    with open(path, 'r') as file:
+        return json.load(file)['results']
+
+
+def compare_results(results, baseline, threshold=0.1):
+    # names of benchmarks whose ns/op grew by more than threshold over the baseline
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result['ns_per_op'] > baseline[name]['ns_per_op'] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def format_results(results, baseline=None):
+    lines = [f'{"benchmark":<52}{"ns/op":>14}{"nodes/s":>12}{"peak KiB":>10}{"change":>9}']
+    for name, result in results.items():
+        nodes_per_sec = f'{result["nodes_per_sec"]:.0f}' if 'nodes_per_sec' in result else '-'
+        peak = f'{result["peak_kib"]:.1f}' if 'peak_kib' in result else '-'
+        change = '-'
+        if baseline and name in baseline:
+            change = f'{(result["ns_per_op"] / baseline[name]["ns_per_op"] - 1) * 100:+.1f}%'
+        lines.append(f'{name:<52}{result["ns_per_op"]:>14.0f}{nodes_per_sec:>12}{peak:>10}{change:>9}')
+    return '\n'.join(lines)
@@ -0,0 +1,109 @@
+import time
+import tracemalloc
+
+import agents
+from benchmarks.positions import MAP_NAMES, get_positions
+
+MIN_TIME = 0.05
+REPEATS = 5
+SEARCHES = (('MinimaxABAgent', 8), ('MaxNAgent', 5))
+
+
+def measure(prepare, run, min_time=MIN_TIME, repeats=REPEATS):
+    # repeats run(prepare()) until min_time is spent, run returns the number of operations done;
+    # the best of several such rounds is kept, as timeit does, to filter out noise of the machine
+    best = None
+    total_ops = 0
+    for _ in range(repeats):
+        ops, elapsed = 0, 0
+        while elapsed < min_time * 1e9:
+            args = prepare()
+            start = time.perf_counter_ns()
+            ops += run(args)
+            elapsed += time.perf_counter_ns() - start
+        total_ops += ops
+        best = elapsed / ops if best is None else min(best, elapsed / ops)
+    return {'ops': total_ops, 'ns_per_op': best}
+
+
+def measure_peak_memory(prepare, run):
+    args = prepare()
+    tracemalloc.start()
+    run(args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def run_legal_actions(states):
+    for state in states:
+        state.get_legal_actions()
+    return len(states)
+
+
+def run_successors(pairs):
+    for state, action in pairs:
+        state.generate_successor_state(action)
+    return len(pairs)
+
+
+def run_scores(states):
+    for state in states:
+        state.get_scores()
+    return len(states)
+
+
+def run_hash(states):
+    for state in states:
+        hash(state)
+    return len(states)
+
+
+def get_engine_benchmarks(positions):
+    pairs = [(state, action) for state in positions for action in state.get_legal_actions()]
+    return {
+        # fresh copies, legal actions are cached on the state
+        'get_legal_actions': (lambda: [state.copy() for state in positions], run_legal_actions),
+        'generate_successor_state': (lambda: pairs, run_successors),
+        'get_scores': (lambda: positions, run_scores),
+        '__hash__': (lambda: positions, run_hash),
+    }
+
+
+def reset_agent(agent, state):
+    # empty tables are allocated before timing and memory tracing start
+    agent.new_game()
+    agent.get_table()
+    agent.get_table(state.get_on_move_chr())
+    return state
+
+
+def run_search(agent, state, depth, repeats=1):
+    # every search starts from empty tables, so that it visits the same nodes each time
+    elapsed = None
+    for _ in range(repeats):
+        reset_agent(agent, state)
+        start = time.perf_counter_ns()
+        agent.get_chosen_action(agent, state, depth)
+        elapsed = min(elapsed or float('inf'), time.perf_counter_ns() - start)
+    return {'ops': repeats, 'ns_per_op': elapsed, 'nodes': agent.nodes,
+            'nodes_per_sec': agent.nodes / elapsed * 1e9 if elapsed else 0.}
+
+
+def run_suite(map_names=MAP_NAMES, searches=SEARCHES, memory=True, seed=0):
+    results = {}
+    for map_name in map_names:
+        positions = get_positions(map_name, seed=seed)
+        for name, (prepare, run) in get_engine_benchmarks(positions).items():
+            result = measure(prepare, run)
+            if memory:
+                result['peak_kib'] = measure_peak_memory(prepare, run)
+            results[f'{map_name}/{name}'] = result
+        for agent_name, depth in searches:
+            agent = getattr(agents, agent_name)
+            result = run_search(agent, positions[0], depth, REPEATS)
+            if memory:
+                result['peak_kib'] = measure_peak_memory(lambda: reset_agent(agent, positions[0]),
+                                                         lambda state: agent.get_chosen_action(agent, state, depth))
+            results[f'{map_name}/{agent_name}@{depth}'] = result
+    return results
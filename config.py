@@ -1,26 +1,37 @@
 import os
 
-import screeninfo
-
-monitor = screeninfo.get_monitors()[0]
-
 # parameters
 MAX_PLAYERS = 4
-M = None
-N = None
-SCREEN_WIDTH = monitor.width
-SCREEN_HEIGHT = monitor.height
+SCREEN_WIDTH = None  # queried from the monitor when the game window is created, see get_screen_size
+SCREEN_HEIGHT = None
 MIN_TILE_SIZE = 32
 TILE_SIZE = 64
 MAX_TILE_SIZE = 128
 TILE_STEP = 0.05
 TILE_OFFSET = None
-INFO_FONT = None
+INFO_FONT = None  # loaded by the game on first draw
 INFO_HEIGHT = 30
 INFO_SIDE_OFFSET = 10
 FRAMES_PER_SEC = 120
-SLEEP_TIME = 0.001
+TIME_BUDGET_FRACTION = 0.8  # share of max think time an agent plans to use
+TT_SIZE = 1 << 18  # entries per transposition table
+MCTS_PLAYOUTS = 2000  # playouts per move when there is no time budget
+MCTS_EXPLORATION = 1.4
+MCTS_GREEDY_RATE = 0.5  # share of greedy moves in playouts
+SEARCH_WORKERS = None  # processes used by parallel agents, None for all cores
+EXECUTOR_START_METHOD = 'spawn'  # how agent worker processes of the visual demo are started
+EXECUTOR_GRACE_TIME = 0.1  # seconds past max think time before an agent worker is killed
+EXECUTOR_SHUTDOWN_TIME = 1.  # seconds an agent worker gets to exit on its own at the end of the game
+PONDERING = False  # search agents keep thinking in their workers while other players move
+PACING_TIME = 0.5  # minimal time per move in the visual demo; headless runs do not pace
 DEBUG = True
+STATS_FORMAT = 'csv'  # per game search stats written next to the log, 'csv', 'json' or None
+
+# map kinds
+SPACESHIP_KINDS = ['A', 'B', 'C', 'D']
+COLORED_TILE_KINDS = ['a', 'b', 'c', 'd']
+ABYSS_TILE_KINDS = ['0']
+FREE_TILE_KINDS = ['_']
 
 # define colors
 WHITE = (255, 255, 255)
@@ -39,3 +50,16 @@ MAP_FOLDER = os.path.join(GAME_FOLDER, 'maps')
 IMG_FOLDER = os.path.join(GAME_FOLDER, 'img')
 LOG_FOLDER = os.path.join(GAME_FOLDER, 'logs')
 FONT_FOLDER = os.path.join(GAME_FOLDER, 'fonts')
+
+
+def get_screen_size():
+    # only the visual game needs display metrics, so screeninfo is imported on first use
+    global SCREEN_WIDTH, SCREEN_HEIGHT
+    if SCREEN_WIDTH is None or SCREEN_HEIGHT is None:
+        try:
+            import screeninfo
+            monitor = screeninfo.get_monitors()[0]
+        except (Exception,):
+            raise Exception('No monitor found, set SCREEN_WIDTH and SCREEN_HEIGHT in config!')
+        SCREEN_WIDTH, SCREEN_HEIGHT = monitor.width, monitor.height
+    return SCREEN_WIDTH, SCREEN_HEIGHT
@@ -0,0 +1,180 @@
+"""
+AGENT EXECUTOR
+Runs an agent in its own long-lived worker process, so that a search never
+shares the interpreter with the render loop and can always be stopped.
+The game sends a move request (agent name, compact state, max depth, max think
+time) through a pipe and gets called back from a waiter thread once the answer
+is there or the deadline has passed, so it never polls in between.
+A worker may be reused for several games, the game tells it when a new one
+starts so that the agent drops its tables.
+Between its turns an agent may ponder: the game sends it every position where
+another player is on move, and the worker searches it from the agent's point
+of view until the next request arrives, so its transposition tables are warm
+when its own turn comes.
+A worker that is still thinking when its hard deadline passes is killed and
+started again; the game plays a fallback move for it instead of ending.
+Workers are spawned, not forked, so they never inherit pygame or a display.
+Each worker leads its own process group, so that killing it also kills the
+search pool processes a parallel agent started in it.
+"""
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import threading
+import time
+
+import config
+
+READY = 'ready'
+MOVE = 'move'
+PONDER = 'ponder'
+NEW_GAME = 'new_game'
+
+
+def serve(connection):
+    import agents
+    from state import State
+
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    connection.send(READY)
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        kind, agent_name, compact, args = request
+        agent = getattr(agents, agent_name)
+        if kind == PONDER:
+            agent.ponder(State.from_compact(compact), *args, connection.poll)
+            continue
+        if kind == NEW_GAME:
+            agent.new_game()
+            continue
+        max_depth, max_think_time = args
+        start_time = time.perf_counter()
+        try:
+            action = agent.get_chosen_action(agent, State.from_compact(compact), max_depth, max_think_time)
+            connection.send((action, time.perf_counter() - start_time, agent.stats, None))
+        except Exception as e:
+            connection.send((None, time.perf_counter() - start_time, None, repr(e)))
+
+
+class AgentExecutor:
+    context = multiprocessing.get_context(config.EXECUTOR_START_METHOD)
+
+    def __init__(self, agent_name):
+        self.agent_name = agent_name
+        self.process = None
+        self.connection = None
+        self.state = None
+        self.start_time = None
+        self.deadline = None
+        self.thinking = False
+        self.restarts = 0
+
+    def start(self):
+        # blocks until the worker has imported the agents
+        connection, child_connection = self.context.Pipe()
+        process = self.context.Process(target=serve, args=(child_connection,), name=self.agent_name)
+        process.start()
+        child_connection.close()
+        self.connection, self.process = connection, process
+        if self.connection.recv() != READY:
+            raise Exception(f'Worker of agent {self.agent_name} did not start!')
+
+    def kill(self):
+        if self.process is not None:
+            if hasattr(os, 'killpg'):
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+            self.process.kill()
+            self.process.join()
+            self.connection.close()
+            self.process = None
+
+    def restart(self):
+        self.kill()
+        self.restarts += 1
+        self.start()
+
+    def shutdown(self):
+        if self.process is None:
+            return
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=config.EXECUTOR_SHUTDOWN_TIME)
+        self.kill()
+
+    def submit(self, state, max_depth, max_think_time=0):
+        if self.process is None or not self.process.is_alive():
+            self.kill()
+            self.start()
+        self.state = state
+        self.thinking = True
+        self.start_time = time.perf_counter()
+        self.deadline = self.start_time + max_think_time + config.EXECUTOR_GRACE_TIME if max_think_time else None
+        self.connection.send((MOVE, self.agent_name, state.to_compact(), (max_depth, max_think_time)))
+
+    def new_game(self):
+        if self.process is not None:
+            self.connection.send((NEW_GAME, self.agent_name, None, ()))
+
+    def ponder(self, state, player):
+        # searched until the next request, nothing is sent back
+        if self.process is not None and not self.thinking:
+            self.connection.send((PONDER, self.agent_name, state.to_compact(), (player,)))
+
+    @staticmethod
+    def get_fallback_action(state):
+        # best single move by tiles painted, cheap enough to never overrun
+        return max(state.get_legal_actions(), key=state.get_action_gain)
+
+    def fall_back(self):
+        self.thinking = False
+        think_time = time.perf_counter() - self.start_time
+        self.restart()
+        return self.get_fallback_action(self.state), think_time, None, True
+
+    def poll(self):
+        # None while the agent is thinking, then (action, think time, stats, timed out)
+        if self.connection.poll():
+            try:
+                action, think_time, stats, error = self.connection.recv()
+            except EOFError:
+                # worker died while thinking
+                return self.fall_back()
+            self.thinking = False
+            if error is not None:
+                raise Exception(f'Agent {self.agent_name} failed: {error}')
+            return action, think_time, stats, False
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            return self.fall_back()
+        return None
+
+    def wait(self):
+        # blocks until the worker answers or the hard deadline passes
+        timeout = None if self.deadline is None else max(0., self.deadline - time.perf_counter())
+        try:
+            multiprocessing.connection.wait([self.connection], timeout)
+        except (OSError, ValueError):
+            # worker killed by shutdown
+            pass
+
+    def notify(self, callback, min_time=0.):
+        # calls callback from a waiter thread once poll has a result, but not before min_time of thinking
+        def waiter():
+            self.wait()
+            left = self.start_time + min_time - time.perf_counter()
+            if left > 0:
+                time.sleep(left)
+            callback()
+
+        threading.Thread(target=waiter, daemon=True).start()
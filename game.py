@@ -1,14 +1,18 @@
 import os
-import threading
-import time
-from queue import Queue
 
 import pygame
 
 import config
+from executor import AgentExecutor
+from headless import read_map, parse_state, get_algorithms
 from sprites import Spaceship, AbyssTile, FreeTile, ColoredTile
-from state import State
-from util import TimedFunction, Timeout, Logger
+from util import Logger
+
+
+AGENT_EVENT = pygame.event.custom_type()
+# tile grid indices, abyss tiles follow the free tile in the order of their image variants
+FREE_TILE = 0
+FIRST_ABYSS_TILE = 1
 
 
 class Quit(Exception):
@@ -20,11 +24,11 @@ class EndGame(Exception):
 
 
 class Game:
-    def adjust_dimensions(self, lines):
-        config.M = len(lines)
-        config.N = len(lines[0].strip())
-        tile_height = int(config.SCREEN_HEIGHT * 0.9 / config.M)
-        tile_width = int(config.SCREEN_WIDTH * 0.9 / config.N)
+    def adjust_dimensions(self, geometry):
+        self.geometry = geometry
+        screen_width, screen_height = config.get_screen_size()
+        tile_height = int(screen_height * 0.9 / self.geometry.m)
+        tile_width = int(screen_width * 0.9 / self.geometry.n)
         if tile_height < config.MIN_TILE_SIZE:
             raise Exception(f'Decrease the number of rows in map! '
                             f'MIN_TILE_SIZE is {config.MIN_TILE_SIZE}px but {tile_height}px occurred.')
@@ -33,123 +37,104 @@ class Game:
                             f'MIN_TILE_SIZE is {config.MIN_TILE_SIZE}px but {tile_width}px occurred.')
         config.TILE_SIZE = int(min(config.MAX_TILE_SIZE, tile_height, tile_width))
         config.TILE_OFFSET = int(config.TILE_SIZE * config.TILE_STEP)
-        self.WIDTH = config.N * config.TILE_SIZE
-        self.HEIGHT = config.M * config.TILE_SIZE
+        self.WIDTH = self.geometry.n * config.TILE_SIZE
+        self.HEIGHT = self.geometry.m * config.TILE_SIZE
         self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT + config.INFO_HEIGHT), flags=pygame.HIDDEN)
 
     def load_map(self, map_name):
-        try:
-            self.sprites_free_tiles = pygame.sprite.Group()
-            self.sprites_abyss_tiles = pygame.sprite.Group()
-            self.sprites_colored_tiles = pygame.sprite.Group()
-            self.sprites_spaceships = pygame.sprite.Group()
-
-            self.colored_map = {}
-            self.spaceships_map = {}
-
-            with open(os.path.join(config.MAP_FOLDER, map_name), 'r') as file:
-                lines = file.readlines()
-                self.adjust_dimensions(lines)
-
-                mask = 1
-                all_ones_mask = (1 << (config.M * config.N)) - 1
-                abyss_tiles_positions_int = 0 & all_ones_mask
-                colored_tiles_positions_dict = {}
-                spaceships_positions_dict = {}
-
-                for i, line in enumerate(lines):
-                    for j, char in enumerate(line.strip()):
-                        tile = FreeTile((i, j))
-                        tile.add(self.sprites_free_tiles)
-                        if char not in FreeTile.kinds():
-                            error_flag = True
-                            if char.lower() in ColoredTile.kinds():
-                                error_flag = False
-                                sprite = ColoredTile(char.lower(), (i, j))
-                                sprite.add(self.sprites_colored_tiles)
-                                self.colored_map[(i, j)] = sprite
-                                if char.lower() not in colored_tiles_positions_dict:
-                                    colored_tiles_positions_dict[char.lower()] = 0 & all_ones_mask
-                                colored_tiles_positions_dict[char.lower()] |= mask
-                                if char in Spaceship.kinds():
-                                    sprite = Spaceship(char, (i, j), char)
-                                    sprite.add(self.sprites_spaceships)
-                                    self.spaceships_map[(i, j)] = sprite
-                                    if char not in spaceships_positions_dict:
-                                        spaceships_positions_dict[char] = mask
-                            if char in AbyssTile.kinds():
-                                error_flag = False
-                                sprite = AbyssTile((i, j))
-                                sprite.add(self.sprites_abyss_tiles)
-                                abyss_tiles_positions_int |= mask
-                            if error_flag:
-                                raise Exception(f'Illegal character {char} in map!')
-                        mask <<= 1
-            return State(spaceships_positions_dict,
-                         colored_tiles_positions_dict,
-                         abyss_tiles_positions_int, self.max_rounds)
-        except Exception as e:
-            raise e
+        # the state comes from the headless parser, only tiles and sprites are built here
+        lines = read_map(map_name)
+        state = parse_state(lines, self.max_rounds)
+        self.adjust_dimensions(state.geometry)
+        self.tile_grid = []
+        self.sprites_spaceships = pygame.sprite.Group()
+        self.spaceships_map = {}
+        for i, line in enumerate(lines):
+            for j, char in enumerate(line):
+                if char in AbyssTile.kinds():
+                    self.tile_grid.append(FIRST_ABYSS_TILE + AbyssTile.random_variant())
+                else:
+                    self.tile_grid.append(FREE_TILE)
+                if char in Spaceship.kinds():
+                    sprite = Spaceship(char, (i, j), char)
+                    sprite.add(self.sprites_spaceships)
+                    self.spaceships_map[(i, j)] = sprite
+        return state
 
-    def get_algorithms(self, algorithms_names):
-        num_of_players = self.state.get_num_of_players()
-        if len(algorithms_names) >= num_of_players:
-            algorithms_names = algorithms_names[:num_of_players]
-        else:
-            algorithms_names += [algorithms_names[-1]] * (num_of_players - len(algorithms_names))
-        module_agents = __import__('agents')
-        return [getattr(module_agents, algo_name) for algo_name in algorithms_names]
-
-    def __init__(self, algorithms_names, map_name, max_rounds, max_think_time, max_depth):
+    def __init__(self, algorithms_names, map_name, max_rounds, max_think_time, max_depth, pacing=config.PACING_TIME):
         self.logger = Logger()
-        pygame.font.init()
-        config.INFO_FONT = pygame.font.Font(os.path.join(config.FONT_FOLDER, 'info_font.ttf'), 22)
         pygame.display.set_caption('Pynter')
+        self.geometry = None
         self.WIDTH = None
         self.HEIGHT = None
         self.screen = None
-        self.sprites_free_tiles = None
-        self.sprites_abyss_tiles = None
-        self.sprites_colored_tiles = None
+        self.tile_grid = None  # tile index of every cell, row by row
         self.sprites_spaceships = None
         self.spaceships_map = None
-        self.colored_map = None
+        self.background = None  # free and abyss tiles, composited once per map
+        self.board = None  # background with the colored tiles painted on it
+        self.drawn_rects = {}  # where each spaceship was drawn last
+        self.dirty_rects = []
+        self.info_key = None  # what the info bar shows
+        self.full_redraw = True
         self.running = True  # application running
         self.playing = False  # play/pause
         self.moving = False  # current agent moving
+        self.thinking = False  # current agent searching in its worker
         self.done = False  # reached goal state
+        self.action = None
+        self.path = None
+        self.current_pos = None
+        self.target_pos = None
         self.max_rounds = max_rounds
         self.think_time = 0
         self.max_think_time = max_think_time
         self.max_depth = max_depth
+        self.stats_records = []
+        self.agent_stats = None
+        self.pacing = pacing
         self.state = self.load_map(map_name)
-        self.algorithms = self.get_algorithms(algorithms_names)
+        self.algorithms = get_algorithms(algorithms_names, self.state.get_num_of_players())
+        self.executors = [AgentExecutor(algorithm.__name__) for algorithm in self.algorithms]
         self.clock = pygame.time.Clock()
 
-    def get_action(self):
+    @staticmethod
+    def post_agent_event():
+        # called from the executor's waiter thread, the event queue is thread safe
         try:
-            tf_queue = Queue(1)
-            tf = TimedFunction(threading.current_thread().ident,
-                               tf_queue, self.max_think_time,
-                               self.algorithms[self.state.get_on_move_ord()].get_chosen_action,
-                               self.algorithms[self.state.get_on_move_ord()],
-                               self.state,
-                               self.max_depth)
-            tf.daemon = True
-            tf.start()
-            sleep_time = config.SLEEP_TIME
-            while tf_queue.empty():
-                time.sleep(sleep_time)
-                self.draw_info_text()
-                self.events()
-            action, elapsed = tf_queue.get(block=False)
-            return action, elapsed
-        except Timeout:
-            print(f'ERROR: Agent action took more than {self.max_think_time} seconds!')
-            raise Quit()
+            pygame.event.post(pygame.event.Event(AGENT_EVENT))
+        except pygame.error:
+            pass
+
+    def request_action(self):
+        executor = self.executors[self.state.get_on_move_ord()]
+        executor.submit(self.state, self.max_depth, self.max_think_time)
+        if config.PONDERING:
+            for ordinal, other in enumerate(self.executors):
+                if other is not executor and self.algorithms[ordinal].pondering:
+                    other.ponder(self.state, config.SPACESHIP_KINDS[ordinal])
+        executor.notify(self.post_agent_event, self.pacing)
+        self.thinking = True
 
-    def perform_action(self):
-        action, self.think_time = self.get_action()
+    def receive_action(self):
+        executor = self.executors[self.state.get_on_move_ord()]
+        result = executor.poll()
+        if result is None:
+            executor.notify(self.post_agent_event, self.pacing)
+            return
+        action, self.think_time, self.agent_stats, timed_out = result
+        coords = self.state.geometry.decode_action(action)
+        if timed_out:
+            self.logger.log_error(f'Agent {self.state.get_on_move_chr()} action took more than {self.max_think_time} '
+                                  f'seconds, playing {coords} instead!', to_std_out=True)
+        self.action, self.path = action, self.get_path(coords)
+        self.current_pos = self.path.pop(0)
+        self.target_pos = self.path.pop(0) if self.path else self.current_pos
+        self.thinking = False
+        self.moving = True
+
+    @staticmethod
+    def get_path(action):
         current_pos, target_pos = action
         row_diff = target_pos[0] - current_pos[0]
         col_diff = target_pos[1] - current_pos[1]
@@ -158,26 +143,32 @@ class Game:
             (current_pos[0], current_pos[1] + x) if row_diff == 0 else (current_pos[0] + x, current_pos[1])
             for x in range(0, col_diff + row_diff + loop_step, loop_step)
         ]
-        return action, path
+        return path
 
     def print_info(self, action):
+        decode_action = self.state.geometry.decode_action
+        action = decode_action(action)
         info_text = (f'\nRound {self.state.get_current_round() + 1} / {self.state.get_max_rounds()}\n'
                      f'In state\n'
                      f'{self.state}\n'
                      f'agent {self.state.get_on_move_chr()} chose action {action} '
-                     f'from actions {self.state.get_legal_actions()}\n'
+                     f'from actions {[decode_action(legal) for legal in self.state.get_legal_actions()]}\n'
                      f'Think time was {self.think_time:.2f} seconds.\n')
         self.logger.log_info(info_text, to_std_out=config.DEBUG)
+        if self.agent_stats is not None:
+            self.logger.log_stats(self.agent_stats, to_std_out=config.DEBUG)
+            self.stats_records.append({'round': self.state.get_current_round(),
+                                       'player': self.state.get_on_move_chr(),
+                                       'agent': self.algorithms[self.state.get_on_move_ord()].__name__,
+                                       'action': action,
+                                       'think_time': self.think_time,
+                                       **self.agent_stats.to_dict()})
 
     def perform_moving(self, current_pos, target_pos, path, action):
         if current_pos != target_pos:
             self.spaceships_map[target_pos] = self.spaceships_map[current_pos]
             del self.spaceships_map[current_pos]
-        sprite = ColoredTile(self.state.get_on_move_chr().lower(), target_pos)
-        if target_pos in self.colored_map:
-            self.colored_map[target_pos].remove(self.sprites_colored_tiles)
-        sprite.add(self.sprites_colored_tiles)
-        self.colored_map[target_pos] = sprite
+        self.paint_tile(self.state.get_on_move_chr().lower(), target_pos)
         if path:
             current_pos = target_pos
             target_pos = path.pop(0)
@@ -190,25 +181,30 @@ class Game:
     def run(self):
         try:
             self.logger.log_info('Starting simulation ...', to_std_out=config.DEBUG)
+            for executor in self.executors:
+                executor.start()
+                executor.new_game()
             self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT + config.INFO_HEIGHT),
                                                   flags=pygame.SHOWN)
-            action, path, current_pos, target_pos = None, None, None, None
+            self.build_layers()
             while self.running:
                 try:
-                    if self.playing:
+                    if self.playing and not self.moving and not self.thinking:
                         if self.state.is_goal_state():
                             self.logger.log_info(f'\nFinal state\n{self.state}', to_std_out=config.DEBUG)
                             raise EndGame()
-                        if not self.moving:
-                            action, path = self.perform_action()
-                            current_pos = path.pop(0)
-                            target_pos = path.pop(0) if path else current_pos
-                            self.moving = True
-                        if not self.spaceships_map[current_pos].move_towards(target_pos):
-                            current_pos, target_pos = self.perform_moving(current_pos, target_pos, path, action)
-                    self.draw()
-                    self.events()
-                    self.clock.tick(config.FRAMES_PER_SEC)
+                        self.request_action()
+                    if self.playing and self.moving:
+                        if not self.spaceships_map[self.current_pos].move_towards(self.target_pos):
+                            self.current_pos, self.target_pos = self.perform_moving(self.current_pos, self.target_pos,
+                                                                                    self.path, self.action)
+                        self.draw()
+                        self.events()
+                        self.clock.tick(config.FRAMES_PER_SEC)
+                    else:
+                        # nothing to animate, sleep until the agent answers or the user does something
+                        self.draw()
+                        self.events(block=True)
                 except EndGame:
                     self.playing = False
                     self.done = True
@@ -219,10 +215,53 @@ class Game:
             self.logger.log_error(repr(e))
             raise e
         finally:
+            for executor in self.executors:
+                executor.shutdown()
+            self.logger.export_stats(self.stats_records)
             self.logger.close()
 
+    def get_tile_rect(self, position):
+        return pygame.Rect(position[1] * config.TILE_SIZE, position[0] * config.TILE_SIZE,
+                           config.TILE_SIZE, config.TILE_SIZE)
+
+    def get_tile_images(self):
+        # one shared surface per tile index
+        return [FreeTile.get_image()] + [AbyssTile.get_image(variant)
+                                         for variant in range(AbyssTile.DIFFERENT_ABYSS_TYPES)]
+
+    def build_layers(self):
+        self.background = pygame.Surface((self.WIDTH, self.HEIGHT)).convert()
+        self.background.fill(config.WHITE)
+        coords = self.state.geometry.coords
+        tile_images = self.get_tile_images()
+        free_tile = tile_images[FREE_TILE]
+        self.background.blits([(free_tile, self.get_tile_rect(coords[idx])) for idx in range(len(self.tile_grid))],
+                              doreturn=False)
+        self.background.blits([(tile_images[tile], self.get_tile_rect(coords[idx]))
+                               for idx, tile in enumerate(self.tile_grid) if tile != FREE_TILE], doreturn=False)
+        self.board = self.background.copy()
+        for kind, colored_tiles in zip(ColoredTile.kinds(), self.state.colored_tiles):
+            while colored_tiles:
+                idx = (colored_tiles & -colored_tiles).bit_length() - 1
+                colored_tiles &= colored_tiles - 1
+                self.board.blit(ColoredTile.get_image(kind), self.get_tile_rect(coords[idx]))
+        self.full_redraw = True
+
+    def paint_tile(self, kind, position):
+        rect = self.get_tile_rect(position)
+        self.board.blit(self.background, rect, rect)
+        self.board.blit(ColoredTile.get_image(kind), rect)
+        self.screen.blit(self.board, rect, rect)
+        self.dirty_rects.append(rect)
+
+    @staticmethod
+    def get_info_font():
+        if config.INFO_FONT is None:
+            pygame.font.init()
+            config.INFO_FONT = pygame.font.Font(os.path.join(config.FONT_FOLDER, 'info_font.ttf'), 22)
+        return config.INFO_FONT
+
     def draw_info_text(self):
-        self.screen.fill(config.BLACK, [0, self.HEIGHT, self.WIDTH, config.INFO_HEIGHT])
         if self.done:
             text_str = 'DONE'
         elif self.playing:
@@ -230,34 +269,60 @@ class Game:
                         f'on move: {self.state.get_on_move_chr()}')
         else:
             text_str = 'PAUSED'
-        text_width, text_height = config.INFO_FONT.size(text_str)
-        text = config.INFO_FONT.render(f'{text_str}', True, config.GREEN)
+        scores = sorted(self.state.get_scores().items())
+        if (text_str, scores) == self.info_key and not self.full_redraw:
+            return
+        self.info_key = (text_str, scores)
+        info_rect = pygame.Rect(0, self.HEIGHT, self.WIDTH, config.INFO_HEIGHT)
+        self.screen.fill(config.BLACK, info_rect)
+        font = self.get_info_font()
+        text_width, text_height = font.size(text_str)
+        text = font.render(f'{text_str}', True, config.GREEN)
         self.screen.blit(text, (self.WIDTH - text_width - config.INFO_SIDE_OFFSET, self.HEIGHT))
 
         total_text_width = 0
-        for i, (key, val) in enumerate(sorted(self.state.get_scores().items())):
+        for i, (key, val) in enumerate(scores):
             text_str = f'{"  " if i else ""}{key}: {val:02d}'
-            text = config.INFO_FONT.render(f'{text_str}', True, Spaceship.colors()[key])
-            text_width, text_height = config.INFO_FONT.size(text_str)
+            text = font.render(f'{text_str}', True, Spaceship.colors()[key])
+            text_width, text_height = font.size(text_str)
             self.screen.blit(text, (total_text_width + config.INFO_SIDE_OFFSET, self.HEIGHT))
             total_text_width += text_width
-        pygame.display.flip()
+        self.dirty_rects.append(info_rect)
 
     def draw(self):
-        self.screen.fill(config.WHITE)
-        self.sprites_free_tiles.draw(self.screen)
-        self.sprites_colored_tiles.draw(self.screen)
-        self.sprites_abyss_tiles.draw(self.screen)
-        self.sprites_spaceships.draw(self.screen)
+        # only what changed since the last frame is drawn and sent to the display
+        if self.full_redraw:
+            self.screen.blit(self.board, (0, 0))
+            self.dirty_rects = [self.screen.get_rect()]
+            self.drawn_rects = {}
+        for sprite in self.sprites_spaceships:
+            drawn_rect = self.drawn_rects.get(sprite)
+            if drawn_rect != sprite.rect:
+                if drawn_rect is not None:
+                    self.screen.blit(self.board, drawn_rect, drawn_rect)
+                    self.dirty_rects.append(drawn_rect)
+                self.dirty_rects.append(sprite.rect.copy())
+                self.drawn_rects[sprite] = sprite.rect.copy()
+        for sprite in self.sprites_spaceships:
+            if sprite.rect.collidelist(self.dirty_rects) != -1:
+                sprite.draw(self.screen)
         self.draw_info_text()
+        self.full_redraw = False
+        if self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+            self.dirty_rects = []
 
-    def events(self):
-        # catch all events here
-        for event in pygame.event.get():
+    def events(self, block=False):
+        # catch all events here, with block wait for the first one
+        for event in [pygame.event.wait()] + pygame.event.get() if block else pygame.event.get():
             if event.type == pygame.QUIT or event.type == pygame.WINDOWCLOSE or \
                     event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                 raise Quit()
+            if event.type == pygame.WINDOWEXPOSED:
+                self.full_redraw = True
             if self.done:
                 return
+            if event.type == AGENT_EVENT:
+                self.receive_action()
             if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
                 self.playing = not self.playing
@@ -0,0 +1,124 @@
+"""
+MAP GEOMETRY
+Everything that depends only on map dimensions, computed once per map size
+and shared by all states of that map. States, games and agents get the map size
+from their geometry only, so maps of different sizes can be played side by side
+in one process.
+
+Rays are kept for 4 directions in the order up, right, down, left.
+rays[d][i] is the mask of all cells strictly beyond cell i in direction d,
+up to the edge of the map, and ray_ends[d][i] is the last of those cells
+(or i itself when i lies on that edge). A slide from i stops one step before
+the first obstacle on its ray: the lowest set bit of (ray & obstacles) for
+right and down, the highest one for up and left.
+
+ACTIONS
+An action is a single int, src * cells + dst, of the cell a spaceship leaves
+and the cell it stops on. encode_action and decode_action convert it from and
+to the ((row, col), (row, col)) form shown to players and written to logs.
+segments[action] is the mask of cells the action paints, src and dst
+included, for every dst on a line with src (src alone for staying).
+
+Zobrist keys for states of the map are kept here as well. They are drawn from
+a generator seeded with both dimensions, so that maps of the same number of
+cells (6 x 7 and 7 x 6) get different keys.
+"""
+import functools
+import random
+
+import config
+
+UP, RIGHT, DOWN, LEFT = range(4)
+DIRECTIONS = (UP, RIGHT, DOWN, LEFT)
+
+
+class Zobrist:
+    def __init__(self, m, n):
+        num_of_cells = m * n
+        self.seed = f'{m}x{n}'
+        self.rng = random.Random(self.seed)
+        self.spaceships = [[self.rng.getrandbits(64) for _ in range(num_of_cells)]
+                           for _ in range(config.MAX_PLAYERS)]
+        self.colored_tiles = [[self.rng.getrandbits(64) for _ in range(num_of_cells)]
+                              for _ in range(config.MAX_PLAYERS)]
+        self.on_move = [self.rng.getrandbits(64) for _ in range(config.MAX_PLAYERS)]
+        self.abyss_tiles = [self.rng.getrandbits(64) for _ in range(num_of_cells)]
+        self.rounds = []
+
+    def round_key(self, current_round):
+        while len(self.rounds) <= current_round:
+            self.rounds.append(self.rng.getrandbits(64))
+        return self.rounds[current_round]
+
+    def map_key(self, abyss_tiles_positions_int, max_rounds):
+        # part of the key that stays the same for all states of one game, one key drawn per max rounds
+        key = random.Random(f'{self.seed}:{max_rounds}').getrandbits(64)
+        idx = 0
+        while abyss_tiles_positions_int:
+            if abyss_tiles_positions_int & 1:
+                key ^= self.abyss_tiles[idx]
+            abyss_tiles_positions_int >>= 1
+            idx += 1
+        return key
+
+
+class Geometry:
+    def __init__(self, m, n):
+        self.m = m
+        self.n = n
+        self.num_of_cells = m * n
+        self.all_ones_mask = (1 << self.num_of_cells) - 1
+        self.row_masks = [((1 << n) - 1) << (i * n) for i in range(m)]
+        self.col_masks = [sum(1 << (i * n + j) for i in range(m)) for j in range(n)]
+        self.coords = [(i // n, i % n) for i in range(self.num_of_cells)]
+        self.steps = (-n, 1, n, -1)
+        self.ascending = (False, True, True, False)
+        self.rays = tuple([0] * self.num_of_cells for _ in DIRECTIONS)
+        self.ray_ends = tuple(list(range(self.num_of_cells)) for _ in DIRECTIONS)
+        for idx in range(self.num_of_cells):
+            row, col = self.coords[idx]
+            for d, (dr, dc) in zip(DIRECTIONS, ((-1, 0), (0, 1), (1, 0), (0, -1))):
+                r, c = row + dr, col + dc
+                while 0 <= r < m and 0 <= c < n:
+                    self.rays[d][idx] |= 1 << (r * n + c)
+                    self.ray_ends[d][idx] = r * n + c
+                    r, c = r + dr, c + dc
+        self.segments = {}
+        for idx in range(self.num_of_cells):
+            self.segments[idx * self.num_of_cells + idx] = 1 << idx
+            for d in DIRECTIONS:
+                mask, dst = 1 << idx, idx
+                while dst != self.ray_ends[d][idx]:
+                    dst += self.steps[d]
+                    mask |= 1 << dst
+                    self.segments[idx * self.num_of_cells + dst] = mask
+        self.zobrist = Zobrist(m, n)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def of(m, n):
+        return Geometry(m, n)
+
+    def __reduce__(self):
+        # pickled states only carry the dimensions, tables are rebuilt once per process
+        return Geometry.of, (self.m, self.n)
+
+    def get_segment_mask(self, src_idx, dst_idx):
+        # cells from src to dst inclusive, along a row or a column
+        return self.segments[src_idx * self.num_of_cells + dst_idx]
+
+    def encode_action(self, action):
+        (src_row, src_col), (dst_row, dst_col) = action
+        return (src_row * self.n + src_col) * self.num_of_cells + dst_row * self.n + dst_col
+
+    def decode_action(self, action):
+        src_idx, dst_idx = divmod(action, self.num_of_cells)
+        return self.coords[src_idx], self.coords[dst_idx]
+
+    def slide_end(self, idx, direction, obstacles):
+        blockers = self.rays[direction][idx] & obstacles
+        if not blockers:
+            return self.ray_ends[direction][idx]
+        if self.ascending[direction]:
+            return (blockers & -blockers).bit_length() - 1 - self.steps[direction]
+        return blockers.bit_length() - 1 - self.steps[direction]
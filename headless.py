@@ -0,0 +1,140 @@
+"""
+HEADLESS SIMULATION
+Plays a game straight on top of State, without pygame, sprites or animation.
+Maps are parsed into states here, Game.load_map builds its sprites on top of
+the same parser. Agents are asked for an action one after another and the
+result holds the final scores and the move history.
+
+Usage:
+    python headless.py RandomAgent,GreedyAgent example_map.txt 5 0 3 [stats file .csv/.json]
+    (agents, map, max rounds, max think time, max depth as in main.py, stats file)
+"""
+import os
+import sys
+import time
+
+import config
+from geometry import Geometry
+from state import State
+from stats import get_records, write_stats
+
+
+def read_map(map_name):
+    with open(os.path.join(config.MAP_FOLDER, map_name), 'r') as file:
+        return [line.strip() for line in file.readlines() if line.strip()]
+
+
+def load_state(map_name, max_rounds):
+    return parse_state(read_map(map_name), max_rounds)
+
+
+def parse_state(lines, max_rounds):
+    geometry = Geometry.of(len(lines), len(lines[0]))
+
+    mask = 1
+    abyss_tiles_positions_int = 0
+    colored_tiles_positions_dict = {}
+    spaceships_positions_dict = {}
+
+    for line in lines:
+        for char in line:
+            if char not in config.FREE_TILE_KINDS:
+                error_flag = True
+                if char.lower() in config.COLORED_TILE_KINDS:
+                    error_flag = False
+                    if char.lower() not in colored_tiles_positions_dict:
+                        colored_tiles_positions_dict[char.lower()] = 0
+                    colored_tiles_positions_dict[char.lower()] |= mask
+                    if char in config.SPACESHIP_KINDS and char not in spaceships_positions_dict:
+                        spaceships_positions_dict[char] = mask
+                if char in config.ABYSS_TILE_KINDS:
+                    error_flag = False
+                    abyss_tiles_positions_int |= mask
+                if error_flag:
+                    raise Exception(f'Illegal character {char} in map!')
+            mask <<= 1
+
+    return State.from_dicts(geometry,
+                            spaceships_positions_dict,
+                            colored_tiles_positions_dict,
+                            abyss_tiles_positions_int, max_rounds)
+
+
+def get_algorithms(algorithms, num_of_players):
+    algorithms = list(algorithms)
+    if len(algorithms) >= num_of_players:
+        algorithms = algorithms[:num_of_players]
+    else:
+        algorithms += [algorithms[-1]] * (num_of_players - len(algorithms))
+    module_agents = __import__('agents')
+    return [getattr(module_agents, algo) if isinstance(algo, str) else algo for algo in algorithms]
+
+
+class HeadlessGame:
+    def __init__(self, algorithms, map_name, max_rounds, max_depth, max_think_time=0, pacing=0):
+        self.map_name = map_name
+        self.max_depth = max_depth
+        self.max_think_time = max_think_time
+        self.pacing = pacing
+        self.state = load_state(map_name, max_rounds)
+        self.algorithms = get_algorithms(algorithms, self.state.get_num_of_players())
+        for algorithm in set(self.algorithms):
+            algorithm.new_game()
+        self.history = []
+
+    def step(self):
+        agent = self.algorithms[self.state.get_on_move_ord()]
+        start_time = time.perf_counter()
+        action = agent.get_chosen_action(agent, self.state, self.max_depth, self.max_think_time)
+        think_time = time.perf_counter() - start_time
+        if think_time < self.pacing:
+            time.sleep(self.pacing - think_time)
+        self.history.append({
+            'round': self.state.get_current_round(),
+            'player': self.state.get_on_move_chr(),
+            'agent': agent.__name__,
+            'action': self.state.geometry.decode_action(action),
+            'think_time': think_time,
+            'nodes': agent.nodes,
+            'depth': agent.depth,
+            'cutoffs': dict(agent.ordering.cutoffs) if hasattr(agent, 'ordering') else {},
+            'stats': agent.stats.to_dict()
+        })
+        self.state = self.state.generate_successor_state(action)
+
+    def run(self):
+        while not self.state.is_goal_state():
+            self.step()
+        return {
+            'map': self.map_name,
+            'agents': [agent.__name__ for agent in self.algorithms],
+            'scores': self.state.get_scores(),
+            'rounds': self.state.get_current_round(),
+            'history': self.history
+        }
+
+
+def simulate(algorithms, map_name, max_rounds, max_depth, max_think_time=0, pacing=0):
+    return HeadlessGame(algorithms, map_name, max_rounds, max_depth, max_think_time, pacing).run()
+
+
+if __name__ == '__main__':
+    algorithms_names = sys.argv[1].split(',') if len(sys.argv) > 1 else ['RandomAgent']
+    if len(algorithms_names) > config.MAX_PLAYERS:
+        raise Exception('Too many agents!')
+    map_filename = sys.argv[2] if len(sys.argv) > 2 else 'example_map.txt'
+    max_rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    max_think_time = float(sys.argv[4]) if len(sys.argv) > 4 else 0
+    max_depth = int(sys.argv[5]) if len(sys.argv) > 5 else 5
+    stats_filename = sys.argv[6] if len(sys.argv) > 6 else None
+    result = simulate(algorithms_names, map_filename, max_rounds, max_depth, max_think_time)
+    for move in result['history']:
+        print(f'R {move["round"] + 1} | {move["player"]} ({move["agent"]}) -> {move["action"]} '
+              f'in {move["think_time"]:.3f}s, depth {move["depth"]}, nodes {move["nodes"]}, '
+              f'EBF {move["stats"]["branching_factor"]:.2f}')
+    print(f'Scores: {result["scores"]}')
+    if stats_filename:
+        if not os.path.exists(config.LOG_FOLDER):
+            os.mkdir(config.LOG_FOLDER)
+        stats_path = write_stats(get_records(result['history']), os.path.join(config.LOG_FOLDER, stats_filename))
+        print(f'Stats written to {stats_path}')
@@ -0,0 +1,72 @@
+"""
+MOVE ORDERING
+Orders the actions of a search node so that alpha-beta cuts off as early as possible.
+Each heuristic can be switched on or off:
+    TT_MOVE     best action stored in the transposition table for this state
+    KILLERS     two latest actions that caused a cutoff at the same game ply
+    HISTORY     actions scored by depth^2 every time they caused a cutoff
+    STATIC_GAIN number of tiles the slide would paint in the mover's color
+Remaining actions keep the order of State.get_legal_actions.
+Cutoffs are counted per heuristic that put the cutting action in front.
+"""
+TT_MOVE = 'tt_move'
+KILLERS = 'killers'
+HISTORY = 'history'
+STATIC_GAIN = 'static_gain'
+UNORDERED = 'unordered'
+HEURISTICS = (TT_MOVE, KILLERS, HISTORY, STATIC_GAIN)
+
+
+class MoveOrdering:
+    def __init__(self, heuristics=HEURISTICS):
+        self.heuristics = frozenset(heuristics)
+        self.killers = {}
+        self.history = {}
+        self.cutoffs = dict.fromkeys(HEURISTICS + (UNORDERED,), 0)
+
+    def clear(self):
+        self.killers = {}
+        self.history = {}
+        self.cutoffs = dict.fromkeys(self.cutoffs, 0)
+
+    def new_search(self):
+        self.killers = {}
+        # keep what history learned on previous moves, but let new cutoffs dominate
+        self.history = {action: score >> 1 for action, score in self.history.items() if score > 1}
+        self.cutoffs = dict.fromkeys(self.cutoffs, 0)
+
+    @staticmethod
+    def get_ply(state):
+        return state.get_current_round() * state.get_num_of_players() + state.get_on_move_ord()
+
+    def order(self, state, actions, tt_action=None):
+        if TT_MOVE not in self.heuristics:
+            tt_action = None
+        killers = self.killers.get(self.get_ply(state), ()) if KILLERS in self.heuristics else ()
+        use_history = HISTORY in self.heuristics
+        use_gain = STATIC_GAIN in self.heuristics
+        scored = []
+        for i, action in enumerate(actions):
+            if action == tt_action:
+                scored.append(((3, 0, 0, -i), action, TT_MOVE))
+            elif action in killers:
+                scored.append(((2 if action == killers[0] else 1, 0, 0, -i), action, KILLERS))
+            else:
+                history = self.history.get(action, 0) if use_history else 0
+                gain = state.get_action_gain(action) if use_gain else 0
+                source = HISTORY if history else STATIC_GAIN if gain else UNORDERED
+                scored.append(((0, history, gain, -i), action, source))
+        scored.sort(reverse=True)
+        return [(action, source) for _, action, source in scored]
+
+    def cutoff(self, state, action, source, depth):
+        self.cutoffs[source] += 1
+        if source == TT_MOVE:
+            return
+        if KILLERS in self.heuristics:
+            ply = self.get_ply(state)
+            killers = self.killers.get(ply, ())
+            if action not in killers:
+                self.killers[ply] = (action,) + killers[:1]
+        if HISTORY in self.heuristics:
+            self.history[action] = self.history.get(action, 0) + depth * depth
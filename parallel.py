@@ -0,0 +1,155 @@
+"""
+PARALLEL ROOT SEARCH
+Root actions of a search are spread over a process pool that lives as long as
+the program, so its start up cost is paid once and every worker keeps its own
+transposition table between the turns of one game.
+Workers share the best root value found so far (alpha) through a small shared
+array [search id, alpha]; a worker reads it once, when it starts searching its
+action, and raises it when it finds something better. A task that is already
+running never sees a bound raised after its start. With young brothers wait
+the first (best ordered) root action is searched alone, so that the others
+start with a real bound.
+The time budget is sent as an absolute deadline on the monotonic clock, so a
+task that waited in the queue gets only what is left of it.
+"""
+import atexit
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+
+shared_bound = None
+last_searches = {}
+
+
+def init_worker(bound):
+    global shared_bound
+    shared_bound = bound
+
+
+def get_agent(agent_name, search):
+    # search is (game, search) of the agent in the main process
+    agent = getattr(__import__('agents'), agent_name)
+    last_search = last_searches.get(agent_name)
+    if last_search != search:
+        last_searches[agent_name] = search
+        if last_search is None or last_search[0] != search[0]:
+            agent.new_game()
+        for table in agent.__dict__.get('tables', {}).values():
+            table.new_search()
+        if hasattr(agent, 'ordering'):
+            agent.ordering.new_search()
+    agent.nodes = 0
+    agent.leaves = 0
+    if hasattr(agent, 'ordering'):
+        agent.ordering.cutoffs = dict.fromkeys(agent.ordering.cutoffs, 0)
+    return agent
+
+
+def get_counters(agent, table, probes, hits):
+    # what this task added to the search statistics of the worker
+    cutoffs = dict(agent.ordering.cutoffs) if hasattr(agent, 'ordering') else {}
+    return agent.nodes, agent.leaves, table.probes - probes, table.hits - hits, cutoffs
+
+
+def set_clock(agent, time_left, deadline):
+    # stops at the search deadline, or earlier if the clocks of the processes disagree
+    if time_left is None:
+        agent.deadline = None
+    else:
+        agent.deadline = time.perf_counter() + max(0., min(time_left, deadline - time.monotonic()))
+
+
+def read_bound(search_id):
+    with shared_bound.get_lock():
+        return shared_bound[1] if shared_bound[0] == search_id else float('-inf')
+
+
+def raise_bound(search_id, value):
+    with shared_bound.get_lock():
+        if shared_bound[0] == search_id and value > shared_bound[1]:
+            shared_bound[1] = value
+
+
+def search_minimax_action(agent_name, search, search_id, state, action, depth, player, time_left, deadline):
+    from agents import SearchTimeout
+    agent = get_agent(agent_name, search)
+    table = agent.get_table(player)
+    probes, hits = table.probes, table.hits
+    set_clock(agent, time_left, deadline)
+    alpha = read_bound(search_id)
+    state.apply(action)
+    try:
+        value, _ = agent.minimax(state, depth - 1, alpha, float('+inf'), player)
+        raise_bound(search_id, value)
+    except SearchTimeout:
+        value = None
+    return action, value, alpha, get_counters(agent, table, probes, hits), os.getpid()
+
+
+def search_max_n_action(agent_name, search, search_id, state, action, depth, player, time_left, deadline):
+    from agents import SearchTimeout
+    agent = get_agent(agent_name, search)
+    table = agent.get_table()
+    probes, hits = table.probes, table.hits
+    set_clock(agent, time_left, deadline)
+    state.apply(action)
+    try:
+        value, _ = agent.max_n(state, depth - 1)
+    except SearchTimeout:
+        value = None
+    return action, value, None, get_counters(agent, table, probes, hits), os.getpid()
+
+
+class SearchPool:
+    executor = None
+    bound = None
+    search_id = 0
+
+    @classmethod
+    def get_executor(cls):
+        if cls.executor is None:
+            cls.bound = multiprocessing.Array('d', [0., float('-inf')])
+            cls.executor = ProcessPoolExecutor(max_workers=config.SEARCH_WORKERS or os.cpu_count(),
+                                               initializer=init_worker, initargs=(cls.bound,))
+            atexit.register(cls.shutdown)
+        return cls.executor
+
+    @classmethod
+    def shutdown(cls):
+        if cls.executor is not None:
+            cls.executor.shutdown(wait=False, cancel_futures=True)
+            cls.executor = None
+
+    @classmethod
+    def new_search_id(cls):
+        cls.search_id += 1
+        with cls.bound.get_lock():
+            cls.bound[0] = cls.search_id
+            cls.bound[1] = float('-inf')
+        return cls.search_id
+
+    @classmethod
+    def split(cls, worker, agent_name, search, state, actions, depth, player, deadline, young_brothers_wait):
+        # returns (action, value, alpha used, counters, worker pid) for every action, value is None on timeout;
+        # counters are (nodes, leaves, TT probes, TT hits, cutoffs per ordering heuristic) of the task
+        executor = cls.get_executor()
+        search_id = cls.new_search_id()
+        time_left = None if deadline is None else max(0., deadline - time.perf_counter())
+        monotonic_deadline = None if deadline is None else time.monotonic() + time_left
+
+        def submit(action):
+            return executor.submit(worker, agent_name, search, search_id, state, action, depth, player, time_left,
+                                   monotonic_deadline)
+
+        results = []
+        if young_brothers_wait:
+            results.append(submit(actions[0]).result())
+            if results[0][1] is None:
+                return results
+            actions = actions[1:]
+        futures = [submit(action) for action in actions]
+        results.extend(future.result() for future in futures)
+        return results
@@ -0,0 +1,86 @@
+"""
+PERFT
+Counts the leaf nodes of the full game tree up to a given depth, walking it
+only through State.get_legal_actions and State.generate_successor_state.
+A goal state is a leaf no matter the remaining depth.
+The counts of the bundled maps are kept as references, so any change to move
+generation or to the state representation can be checked against them, and
+the time of each depth doubles as a throughput benchmark of the rules engine.
+
+Usage:
+    python perft.py example_map.txt 5 5 divide
+    (map, depth, max rounds, per root action breakdown)
+"""
+import sys
+import time
+
+from headless import load_state
+
+# leaf counts for depths 1, 2, ... with max rounds 5
+REFERENCE_COUNTS = {
+    'example_map.txt': (4, 15, 64, 281, 1243, 5561, 24868),
+    'four_player_map.txt': (5, 22, 95, 343, 1597, 7370, 32106)
+}
+REFERENCE_MAX_ROUNDS = 5
+
+
+def perft(state, depth):
+    if depth == 0 or state.is_goal_state():
+        return 1
+    if depth == 1:
+        return len(state.get_legal_actions())
+    return sum(perft(state.generate_successor_state(action), depth - 1) for action in state.get_legal_actions())
+
+
+def divide(state, depth):
+    # leaf count below every root action
+    if depth == 0 or state.is_goal_state():
+        return {}
+    return {action: perft(state.generate_successor_state(action), depth - 1)
+            for action in state.get_legal_actions()}
+
+
+def get_reference(map_name, depth, max_rounds=REFERENCE_MAX_ROUNDS):
+    counts = REFERENCE_COUNTS.get(map_name)
+    if max_rounds != REFERENCE_MAX_ROUNDS or counts is None or not 0 < depth <= len(counts):
+        return None
+    return counts[depth - 1]
+
+
+def run_perft(map_name, max_depth, max_rounds=REFERENCE_MAX_ROUNDS):
+    # returns a (depth, nodes, seconds, reference) record for every depth up to max_depth
+    results = []
+    for depth in range(1, max_depth + 1):
+        state = load_state(map_name, max_rounds)
+        start_time = time.perf_counter()
+        nodes = perft(state, depth)
+        elapsed = time.perf_counter() - start_time
+        results.append((depth, nodes, elapsed, get_reference(map_name, depth, max_rounds)))
+    return results
+
+
+def check_references(map_names=None):
+    # returns a list of mismatches with the reference counts
+    mismatches = []
+    for map_name in map_names or REFERENCE_COUNTS:
+        for depth, nodes, _, reference in run_perft(map_name, len(REFERENCE_COUNTS[map_name])):
+            if nodes != reference:
+                mismatches.append(f'{map_name}, depth {depth}: {nodes} nodes instead of {reference}')
+    return mismatches
+
+
+if __name__ == '__main__':
+    map_name = sys.argv[1] if len(sys.argv) > 1 else 'example_map.txt'
+    max_depth = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    max_rounds = int(sys.argv[3]) if len(sys.argv) > 3 else REFERENCE_MAX_ROUNDS
+    if len(sys.argv) > 4 and sys.argv[4] == 'divide':
+        state = load_state(map_name, max_rounds)
+        counts = divide(state, max_depth)
+        for action, nodes in counts.items():
+            print(f'{state.geometry.decode_action(action)}: {nodes}')
+        print(f'Total: {sum(counts.values())}')
+    else:
+        for depth, nodes, elapsed, reference in run_perft(map_name, max_depth, max_rounds):
+            status = '' if reference is None else ' OK' if nodes == reference else f' MISMATCH, expected {reference}'
+            print(f'depth {depth}: {nodes} nodes in {elapsed:.4f}s ({nodes / elapsed if elapsed else 0:.0f} nodes/s)'
+                  f'{status}')
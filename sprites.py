@@ -7,6 +7,7 @@ import config
 
 
 class BaseSprite(pygame.sprite.Sprite):
+    # scaled images by (image name, size), shared by every sprite and tile of the kind and never drawn on
     images_dict = {}
 
     def __init__(self, position, size, kind, image_name=None, offset=(0, 0)):
@@ -14,16 +15,24 @@ class BaseSprite(pygame.sprite.Sprite):
         self.kind = kind
         if image_name is None:
             image_name = f'{self.__class__.__name__.lower()}.png'
-        if image_name in BaseSprite.images_dict:
-            image = BaseSprite.images_dict[image_name]
-        else:
+        self.image = self.load_image(image_name, size)
+        self.rect = self.image.get_rect()
+        self.rect.topleft = (position[1] * config.TILE_SIZE + offset[1], position[0] * config.TILE_SIZE + offset[0])
+
+    @staticmethod
+    def load_image(image_name, size):
+        key = (image_name, tuple(size))
+        if key not in BaseSprite.images_dict:
             image = pygame.image.load(os.path.join(config.IMG_FOLDER, image_name)).convert()
             image = pygame.transform.scale(image, size)
             image.set_colorkey(config.WHITE)
-            BaseSprite.images_dict[image_name] = image
-        self.image = image.copy()
-        self.rect = self.image.get_rect()
-        self.rect.topleft = (position[1] * config.TILE_SIZE + offset[1], position[0] * config.TILE_SIZE + offset[0])
+            BaseSprite.images_dict[key] = image
+        return BaseSprite.images_dict[key]
+
+    @classmethod
+    def get_image(cls, suffix=''):
+        # tile sized image of the kind, for drawing tiles without sprite objects
+        return cls.load_image(f'{cls.__name__.lower()}{suffix}.png', (config.TILE_SIZE, config.TILE_SIZE))
 
     def draw(self, screen):
         screen.blit(self.image, self.rect)
@@ -59,7 +68,7 @@ class Spaceship(BaseSprite):
 
     @classmethod
     def kinds(cls):
-        return ['A', 'B', 'C', 'D']
+        return config.SPACESHIP_KINDS
 
     @staticmethod
     def colors():
@@ -79,21 +88,31 @@ class ColoredTile(BaseSprite):
         super().__init__(position, (config.TILE_SIZE, config.TILE_SIZE),
                          kind, f'{self.__class__.__name__.lower()}_{kind}.png')
 
+    @classmethod
+    def get_image(cls, kind):
+        return super().get_image(f'_{kind}')
+
     @classmethod
     def kinds(cls):
-        return ['a', 'b', 'c', 'd']
+        return config.COLORED_TILE_KINDS
 
 
 class AbyssTile(BaseSprite):
     DIFFERENT_ABYSS_TYPES = 7
 
-    def __init__(self, position):
+    def __init__(self, position, variant=None):
+        if variant is None:
+            variant = self.random_variant()
         super().__init__(position, (config.TILE_SIZE, config.TILE_SIZE),
-                         '0', f'{self.__class__.__name__.lower()}{randint(0, AbyssTile.DIFFERENT_ABYSS_TYPES - 1)}.png')
+                         '0', f'{self.__class__.__name__.lower()}{variant}.png')
+
+    @staticmethod
+    def random_variant():
+        return randint(0, AbyssTile.DIFFERENT_ABYSS_TYPES - 1)
 
     @classmethod
     def kinds(cls):
-        return ['0']
+        return config.ABYSS_TILE_KINDS
 
 
 class FreeTile(BaseSprite):
@@ -102,4 +121,4 @@ class FreeTile(BaseSprite):
 
     @classmethod
     def kinds(cls):
-        return ['_']
+        return config.FREE_TILE_KINDS
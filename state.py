@@ -28,40 +28,98 @@ _ _ _ _ 0 b B    0 0 0 0 1 1 1    0 0 0 0 0 0 0     0 0 0 0 0 1 1    0 0 0 0 1 0
 A position = 2^16
 B position = 2^41
 
+Spaceship positions and colored tiles are kept in tuples indexed by player
+ordinal (A and a -> 0, B and b -> 1, ...). Everything that depends only on
+the map (dimensions, masks, ray tables, Zobrist keys) lives in one shared
+Geometry object, so a state holds nothing but its bitboards.
+States are immutable: generate_successor_state builds a new one directly.
+The only exception is the make/unmake pair apply/undo, meant for searches on
+their own copy of a state: apply plays a legal action in place and pushes
+what it replaced on an undo stack, undo pops and restores it.
+
+ZOBRIST KEY
+Every state also carries a 64 bit Zobrist key, XOR of random keys for each
+spaceship position, each colored tile, player on move and current round,
+and of the abyss tiles and max rounds, so that states of different games
+never share a key.
+It is updated incrementally by generate_successor_state and used as hash and
+transposition table key.
+
+ACTIONS
+Actions are ints, src * cells + dst (see Geometry), inside the engine and the
+agents. Only the game converts them to coordinates, for moving sprites and
+for logs.
+
+SCORES
+Score of every player (number of tiles in its color) is kept next to the
+bitboards and updated with the tiles each move paints and takes over, so
+reading scores never counts bits.
 """
-import copy
-import math
-from collections import Counter
-
 import config
-from sprites import Spaceship, AbyssTile, ColoredTile
+from geometry import DIRECTIONS, Geometry
+
+
+def popcount(bitboard):
+    return bitboard.bit_count() if hasattr(bitboard, 'bit_count') else bin(bitboard).count('1')
 
 
 class State:
-    def __init__(self, spaceships_positions_dict, colored_tiles_positions_dict, abyss_tiles_positions_int, max_rounds):
-        self.all_ones_mask = (1 << (config.M * config.N)) - 1
-        self.row_masks = [((1 << config.N) - 1) << (i * config.N) for i in range(config.M)]
-        self.num_of_players = len(spaceships_positions_dict)
-        self.spaceships_positions_dict = spaceships_positions_dict
-        self.colored_tiles_positions_dict = colored_tiles_positions_dict
+    __slots__ = ('geometry', 'num_of_players', 'spaceships', 'colored_tiles', 'scores', 'abyss_tiles_positions_int',
+                 'on_move', 'max_rounds', 'current_round', 'zobrist_key', 'legal_actions', 'undo_stack')
+
+    def __init__(self, geometry, spaceships, colored_tiles, abyss_tiles_positions_int, max_rounds,
+                 on_move=0, current_round=0, zobrist_key=None, scores=None):
+        self.geometry = geometry
+        self.num_of_players = len(spaceships)
+        self.spaceships = spaceships
+        self.colored_tiles = colored_tiles
+        self.scores = tuple(popcount(color) for color in colored_tiles) if scores is None else scores
         self.abyss_tiles_positions_int = abyss_tiles_positions_int
-        self.on_move = 0
-        self.legal_actions = {}
+        self.on_move = on_move
         self.max_rounds = max_rounds
-        self.current_round = 0
+        self.current_round = current_round
+        self.zobrist_key = self.compute_zobrist_key() if zobrist_key is None else zobrist_key
+        self.legal_actions = None
+        self.undo_stack = None
+
+    @classmethod
+    def from_dicts(cls, geometry, spaceships_positions_dict, colored_tiles_positions_dict, abyss_tiles_positions_int,
+                   max_rounds):
+        kinds = config.SPACESHIP_KINDS[:len(spaceships_positions_dict)]
+        if sorted(spaceships_positions_dict) != kinds:
+            raise Exception(f'Spaceships must be named {", ".join(kinds)} in map!')
+        for kind in colored_tiles_positions_dict:
+            if kind.upper() not in spaceships_positions_dict:
+                raise Exception(f'Colored tile {kind} has no spaceship in map!')
+        return cls(geometry,
+                   tuple(spaceships_positions_dict[kind] for kind in kinds),
+                   tuple(colored_tiles_positions_dict.get(kind.lower(), 0) for kind in kinds),
+                   abyss_tiles_positions_int, max_rounds)
+
+    def to_compact(self):
+        # plain tuple of ints to send a state to another process, geometry is rebuilt there from m and n
+        return (self.geometry.m, self.geometry.n, self.spaceships, self.colored_tiles, self.abyss_tiles_positions_int,
+                self.max_rounds, self.on_move, self.current_round, self.zobrist_key)
+
+    @classmethod
+    def from_compact(cls, compact):
+        m, n, spaceships, colored_tiles, abyss_tiles_positions_int, max_rounds, on_move, current_round, \
+            zobrist_key = compact
+        return cls(Geometry.of(m, n), spaceships, colored_tiles, abyss_tiles_positions_int, max_rounds,
+                   on_move, current_round, zobrist_key)
 
     def __str__(self):
-        char_matrix = [['_'] * config.N for _ in range(config.M)]
-        for i in range(config.M):
-            for j in range(config.N):
-                mask_set_bit = 1 << (i * config.N + j)
-                for kind, position in self.spaceships_positions_dict.items():
+        m, n = self.geometry.m, self.geometry.n
+        char_matrix = [['_'] * n for _ in range(m)]
+        for i in range(m):
+            for j in range(n):
+                mask_set_bit = 1 << (i * n + j)
+                for ordinal, position in enumerate(self.spaceships):
                     if mask_set_bit == position:
-                        char_matrix[i][j] = kind
+                        char_matrix[i][j] = config.SPACESHIP_KINDS[ordinal]
                         break
-                    elif kind.lower() in self.colored_tiles_positions_dict and (
-                            mask_set_bit & self.colored_tiles_positions_dict[kind.lower()]):
-                        char_matrix[i][j] = kind.lower()
+                    elif mask_set_bit & self.colored_tiles[ordinal]:
+                        char_matrix[i][j] = config.COLORED_TILE_KINDS[ordinal]
                         break
                 else:
                     if mask_set_bit & self.abyss_tiles_positions_int:
@@ -71,21 +129,37 @@ class State:
     def __eq__(self, other):
         if not isinstance(other, State):
             return False
-        return (self.get_state(Spaceship.kinds()) == other.get_state(Spaceship.kinds()) and
-                self.get_state(ColoredTile.kinds()) == other.get_state(ColoredTile.kinds()) and
-                self.get_state(AbyssTile.kinds()) == other.get_state(AbyssTile.kinds()) and
-                self.on_move == other.on_move)
+        return (self.zobrist_key == other.zobrist_key and
+                self.spaceships == other.spaceships and
+                self.colored_tiles == other.colored_tiles and
+                self.abyss_tiles_positions_int == other.abyss_tiles_positions_int and
+                self.on_move == other.on_move and
+                self.current_round == other.current_round)
 
     def __hash__(self):
-        return hash((
-            self.get_state(Spaceship.kinds()),
-            self.get_state(ColoredTile.kinds()),
-            self.get_state(AbyssTile.kinds()),
-            self.on_move
-        ))
+        return self.zobrist_key
 
     def __lt__(self, other):
-        return self.get_state(Spaceship.kinds()) < other.get_state(Spaceship.kinds())
+        return self.get_state(config.SPACESHIP_KINDS) < other.get_state(config.SPACESHIP_KINDS)
+
+    def compute_zobrist_key(self):
+        zobrist = self.geometry.zobrist
+        key = zobrist.on_move[self.on_move] ^ zobrist.round_key(self.current_round) ^ \
+            zobrist.map_key(self.abyss_tiles_positions_int, self.max_rounds)
+        for ordinal, position in enumerate(self.spaceships):
+            key ^= zobrist.spaceships[ordinal][position.bit_length() - 1]
+        for ordinal, color in enumerate(self.colored_tiles):
+            keys = zobrist.colored_tiles[ordinal]
+            idx = 0
+            while color:
+                if color & 1:
+                    key ^= keys[idx]
+                color >>= 1
+                idx += 1
+        return key
+
+    def get_zobrist_key(self):
+        return self.zobrist_key
 
     def get_num_of_players(self):
         return self.num_of_players
@@ -97,193 +171,155 @@ class State:
         return self.max_rounds
 
     def get_scores(self):
-        result = {}
-        for kind, color in self.colored_tiles_positions_dict.items():
-            result[kind.upper()] = self.get_score(kind)
-        return result
+        return dict(zip(config.SPACESHIP_KINDS, self.scores))
 
     def get_score(self, kind):
-        color = self.colored_tiles_positions_dict[kind.lower()]
-        score = color.bit_count() if hasattr(color, 'bit_count') else bin(color).count('1')
-        return score
+        return self.scores[ord(kind.upper()) - ord('A')]
 
     def get_state(self, kind=None):
         if kind is None:
-            state = 0
-            for val in self.spaceships_positions_dict.values():
-                state |= val
-            for val in self.colored_tiles_positions_dict.values():
+            state = self.abyss_tiles_positions_int
+            for val in self.spaceships:
                 state |= val
-            state |= self.abyss_tiles_positions_int
-            return state
-        elif type(kind) is list and Counter(kind) == Counter(self.spaceships_positions_dict.keys()):
-            state = 0
-            for val in self.spaceships_positions_dict.values():
+            for val in self.colored_tiles:
                 state |= val
             return state
-        elif type(kind) is list and Counter(kind) == Counter(self.colored_tiles_positions_dict.keys()):
+        elif type(kind) is list:
             state = 0
-            for val in self.colored_tiles_positions_dict.values():
-                state |= val
+            for k in kind:
+                if k in config.ABYSS_TILE_KINDS:
+                    state |= self.abyss_tiles_positions_int
+                elif ord(k.upper()) - ord('A') < self.num_of_players:
+                    state |= self.get_state(k)
             return state
-        elif kind in Spaceship.kinds():
-            return self.spaceships_positions_dict[kind]
-        elif kind in ColoredTile.kinds():
-            return self.colored_tiles_positions_dict[kind]
-        elif kind in AbyssTile.kinds():
+        elif kind in config.SPACESHIP_KINDS:
+            return self.spaceships[ord(kind) - ord('A')]
+        elif kind in config.COLORED_TILE_KINDS:
+            return self.colored_tiles[ord(kind) - ord('a')]
+        elif kind in config.ABYSS_TILE_KINDS:
             return self.abyss_tiles_positions_int
         raise ValueError(f'ERROR: No such kind: {kind}')
 
     def is_goal_state(self):
-        return (self.get_state() == self.all_ones_mask) or (self.current_round == self.max_rounds)
+        return (self.get_state() == self.geometry.all_ones_mask) or (self.current_round == self.max_rounds)
 
-    @staticmethod
-    def get_action_cost(action):
-        return int(abs(action[0][0] - action[1][0]) + abs(action[0][1] - action[1][1]))
+    def get_action_cost(self, action):
+        (src_row, src_col), (dst_row, dst_col) = self.geometry.decode_action(action)
+        return abs(src_row - dst_row) + abs(src_col - dst_col)
 
     def get_legal_actions(self):
         if self.is_goal_state():
             return []
 
-        if self.get_on_move_chr() in self.legal_actions:
-            return self.legal_actions[self.get_on_move_chr()]
+        if self.legal_actions is not None:
+            return self.legal_actions
 
-        obstacles = 0
-        for pos in self.spaceships_positions_dict.values():
+        obstacles = self.abyss_tiles_positions_int
+        for pos in self.spaceships:
             obstacles |= pos
-        obstacles |= self.abyss_tiles_positions_int
 
-        position = self.spaceships_positions_dict[self.get_on_move_chr()]
+        position = self.spaceships[self.on_move]
         obs = obstacles & ~position
 
-        pos_idx = int(math.log2(position))
+        geometry = self.geometry
+        src_idx = position.bit_length() - 1
+        src = src_idx * geometry.num_of_cells
 
+        # full slides up, right, down and left, then one tile moves in the same order
         actions = []
-
-        # up all the way
-        new_b = position
-        while (val := (new_b >> config.N)) and not (val & obs):
-            new_b = val
-        end_idx = int(math.log2(new_b))
-        if pos_idx != end_idx:
-            actions.append((pos_idx, end_idx))
-
-        # right all the way
-        m = self.row_masks[pos_idx // config.N]
-        new_b = position
-        while (val := (new_b << 1)) & m and not (val & obs):
-            new_b = val
-        end_idx = int(math.log2(new_b))
-        if pos_idx != end_idx:
-            actions.append((pos_idx, end_idx))
-
-        # down all the way
-        new_b = position
-        while (val := (new_b << config.N)) <= self.all_ones_mask and not (val & obs):
-            new_b = val
-        end_idx = int(math.log2(new_b))
-        if pos_idx != end_idx:
-            actions.append((pos_idx, end_idx))
-
-        # left all the way
-        new_b = position
-        while (val := (new_b >> 1)) & m and not (val & obs):
-            new_b = val
-        end_idx = int(math.log2(new_b))
-        if pos_idx != end_idx:
-            actions.append((pos_idx, end_idx))
-
-        def bit_to_coord(idx):
-            return idx // config.N, idx % config.N
-
-        actions = [(bit_to_coord(a[0]), bit_to_coord(a[1])) for a in actions]
-
-        # one tile movement actions
         one_tile_actions = []
-        for src, dst in actions:
-            diff_row = dst[0] - src[0]
-            diff_col = dst[1] - src[1]
-            if abs(diff_row) > 1:
-                nr = src[0] + (1 if diff_row > 0 else -1)
-                nc = src[1]
-                dst_bit = 1 << (nr * config.N + nc)
-                if not (dst_bit & obs):
-                    one_tile_actions.append((src, (nr, nc)))
-            elif abs(diff_col) > 1:
-                nr = src[0]
-                nc = src[1] + (1 if diff_col > 0 else -1)
-                dst_bit = 1 << (nr * config.N + nc)
-                if not (dst_bit & obs):
-                    one_tile_actions.append((src, (nr, nc)))
-
+        for direction in DIRECTIONS:
+            end_idx = geometry.slide_end(src_idx, direction, obs)
+            if end_idx != src_idx:
+                actions.append(src + end_idx)
+                one_tile_idx = src_idx + geometry.steps[direction]
+                if end_idx != one_tile_idx:
+                    one_tile_actions.append(src + one_tile_idx)
         actions.extend(one_tile_actions)
 
         # stay on tile action
-        actions.append((bit_to_coord(pos_idx), bit_to_coord(pos_idx)))
-        self.legal_actions[self.get_on_move_chr()] = actions
+        actions.append(src + src_idx)
+        self.legal_actions = actions
 
         return actions
 
+    def get_action_gain(self, action):
+        # number of tiles the action paints in the color of the player on move
+        return popcount(self.geometry.segments[action] & ~self.colored_tiles[self.on_move])
+
     def get_on_move_ord(self):
         return self.on_move
 
     def get_on_move_chr(self):
         return chr(ord('A') + self.on_move)
 
-    def move_to_next_player(self):
-        self.on_move = (self.on_move + 1) % self.num_of_players
-        if self.on_move == 0:
-            self.current_round += 1
-
     def generate_successor_state(self, action):
         if self.is_goal_state():
             raise Exception(f'ERROR: State is goal!\n{self}')
 
-        current_spaceship = self.get_on_move_chr()
         legal_actions = self.get_legal_actions()
         if action not in legal_actions:
             raise Exception(f'ERROR: Illegal action {action}!')
 
-        # shallow copy
-        copy_state = copy.copy(self)
-        # deep copy
-        copy_state.spaceships_positions_dict = self.spaceships_positions_dict.copy()
-        copy_state.colored_tiles_positions_dict = self.colored_tiles_positions_dict.copy()
-        copy_state.legal_actions = {}
-
-        src, dst = action
-        src_mask = (1 << (src[0] * config.N + src[1])) & self.all_ones_mask
-        dst_mask = (1 << (dst[0] * config.N + dst[1])) & self.all_ones_mask
-        # clear spaceship from current position
-        copy_state.spaceships_positions_dict[current_spaceship] &= ~src_mask
-        # set spaceship to next position
-        copy_state.spaceships_positions_dict[current_spaceship] |= dst_mask
-
-        # coloring tiles
-        diff_row = dst[0] - src[0]
-        diff_col = dst[1] - src[1]
-        if diff_row:
-            step = 1 if diff_row > 0 else -1
-            for i in range(0, diff_row + step, step):
-                pos = src[0] + i
-                bit = 1 << (pos * config.N + src[1])
-                for key in copy_state.colored_tiles_positions_dict:
-                    if key == current_spaceship.lower():
-                        copy_state.colored_tiles_positions_dict[key] |= bit
-                    else:
-                        copy_state.colored_tiles_positions_dict[key] &= ~bit
-        elif diff_col != 0:
-            step = 1 if diff_col > 0 else -1
-            for i in range(0, diff_col + step, step):
-                pos = src[1] + i
-                bit = 1 << (src[0] * config.N + pos)
-                for key in copy_state.colored_tiles_positions_dict:
-                    if key == current_spaceship.lower():
-                        copy_state.colored_tiles_positions_dict[key] |= bit
-                    else:
-                        copy_state.colored_tiles_positions_dict[key] &= ~bit
-        else:
-            pass
-
-        copy_state.move_to_next_player()
-        return copy_state
+        spaceships, colored_tiles, scores, on_move, current_round, key = self.play(action)
+        return State(self.geometry, spaceships, colored_tiles, self.abyss_tiles_positions_int,
+                     self.max_rounds, on_move, current_round, key, scores)
+
+    def play(self, action):
+        geometry = self.geometry
+        zobrist = geometry.zobrist
+        player = self.on_move
+        src_idx, dst_idx = divmod(action, geometry.num_of_cells)
+
+        # move spaceship
+        spaceships = list(self.spaceships)
+        spaceships[player] = 1 << dst_idx
+        key = self.zobrist_key ^ zobrist.spaceships[player][src_idx] ^ zobrist.spaceships[player][dst_idx]
+
+        # coloring tiles, the mover's spaceship already stands on its own color, so staying changes nothing
+        colored_tiles = list(self.colored_tiles)
+        scores = list(self.scores)
+        segment = geometry.segments[action]
+        for ordinal, color in enumerate(colored_tiles):
+            if ordinal == player:
+                changed = segment & ~color
+                colored_tiles[ordinal] = color | segment
+                scores[ordinal] += popcount(changed)
+            else:
+                changed = segment & color
+                colored_tiles[ordinal] = color & ~segment
+                scores[ordinal] -= popcount(changed)
+            if changed:
+                keys = zobrist.colored_tiles[ordinal]
+                while changed:
+                    bit = changed & -changed
+                    key ^= keys[bit.bit_length() - 1]
+                    changed ^= bit
+
+        # move to next player
+        on_move = (player + 1) % self.num_of_players
+        current_round = self.current_round
+        key ^= zobrist.on_move[player] ^ zobrist.on_move[on_move]
+        if on_move == 0:
+            key ^= zobrist.round_key(current_round) ^ zobrist.round_key(current_round + 1)
+            current_round += 1
+
+        return tuple(spaceships), tuple(colored_tiles), tuple(scores), on_move, current_round, key
+
+    def apply(self, action):
+        # no legality check, action must come from get_legal_actions
+        if self.undo_stack is None:
+            self.undo_stack = []
+        self.undo_stack.append((self.spaceships, self.colored_tiles, self.scores, self.on_move, self.current_round,
+                                self.zobrist_key, self.legal_actions))
+        (self.spaceships, self.colored_tiles, self.scores, self.on_move, self.current_round,
+         self.zobrist_key) = self.play(action)
+        self.legal_actions = None
+
+    def undo(self):
+        (self.spaceships, self.colored_tiles, self.scores, self.on_move, self.current_round,
+         self.zobrist_key, self.legal_actions) = self.undo_stack.pop()
+
+    def copy(self):
+        return State(self.geometry, self.spaceships, self.colored_tiles, self.abyss_tiles_positions_int,
+                     self.max_rounds, self.on_move, self.current_round, self.zobrist_key, self.scores)
@@ -0,0 +1,100 @@
+"""
+SEARCH STATISTICS
+A record of where a search agent spent its time on one move: nodes visited,
+leaf evaluations, alpha-beta cutoffs, transposition table probes and hits,
+depth of the deepest completed iteration and the nodes and time of every
+iteration. Parallel agents add the nodes of every pool worker, MCTS adds its
+playout iterations and their rate. Agents fill one record per move, games
+log it and export the records of a whole game as CSV or JSON.
+
+Effective branching factor is the ratio of nodes between the last two
+iterations, or the depth-th root of all nodes after a single iteration.
+"""
+import csv
+import json
+import time
+
+FIELDS = ('nodes', 'leaves', 'cutoffs', 'tt_probes', 'tt_hits', 'depth', 'time', 'branching_factor',
+          'iteration_nodes', 'iteration_times', 'worker_nodes', 'mcts_iterations', 'mcts_iterations_per_sec')
+
+
+class SearchStats:
+    def __init__(self):
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.depth = 0
+        self.time = 0.
+        self.start_time = time.perf_counter()
+        self.iterations = []  # (depth, nodes, seconds) of every completed iteration
+        self.worker_nodes = {}  # pid -> nodes of every SearchPool worker
+        self.mcts_iterations = 0
+        self.mcts_iterations_per_sec = 0.
+
+    def add_iteration(self, depth, nodes, seconds):
+        self.iterations.append((depth, nodes, seconds))
+
+    def finish(self):
+        self.time = time.perf_counter() - self.start_time
+
+    def get_branching_factor(self):
+        if len(self.iterations) > 1 and self.iterations[-2][1]:
+            return self.iterations[-1][1] / self.iterations[-2][1]
+        if self.iterations and self.iterations[-1][0]:
+            depth, nodes, _ = self.iterations[-1]
+            return nodes ** (1 / depth)
+        return 0.
+
+    def get_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.
+
+    def to_dict(self):
+        return {
+            'nodes': self.nodes,
+            'leaves': self.leaves,
+            'cutoffs': self.cutoffs,
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'depth': self.depth,
+            'time': self.time,
+            'branching_factor': self.get_branching_factor(),
+            'iteration_nodes': [nodes for _, nodes, _ in self.iterations],
+            'iteration_times': [seconds for _, _, seconds in self.iterations],
+            'worker_nodes': [nodes for _, nodes in sorted(self.worker_nodes.items())],
+            'mcts_iterations': self.mcts_iterations,
+            'mcts_iterations_per_sec': self.mcts_iterations_per_sec
+        }
+
+    def __str__(self):
+        iterations = ', '.join(f'{depth}: {nodes} in {seconds:.3f}s' for depth, nodes, seconds in self.iterations)
+        workers = ', '.join(str(nodes) for _, nodes in sorted(self.worker_nodes.items()))
+        mcts = f'{self.mcts_iterations} ({self.mcts_iterations_per_sec:.0f}/s)' if self.mcts_iterations else ''
+        return (f'nodes {self.nodes}, leaves {self.leaves}, cutoffs {self.cutoffs}, '
+                f'TT hits {self.tt_hits}/{self.tt_probes} ({self.get_hit_rate():.0%}), depth {self.depth}, '
+                f'EBF {self.get_branching_factor():.2f}, time {self.time:.3f}s'
+                f'{f", iterations [{iterations}]" if iterations else ""}'
+                f'{f", worker nodes [{workers}]" if workers else ""}'
+                f'{f", MCTS iterations {mcts}" if mcts else ""}')
+
+
+def get_records(history):
+    # one flat record per move of a game history, as kept by HeadlessGame
+    return [{'round': move['round'], 'player': move['player'], 'agent': move['agent'], 'action': move['action'],
+             'think_time': move['think_time'], **move['stats']} for move in history]
+
+
+def write_stats(records, path):
+    # records are dicts of one move each, the format follows the file extension (.json or .csv)
+    with open(path, 'w', newline='') as file:
+        if path.endswith('.json'):
+            json.dump(records, file, indent=2, default=str)
+            return path
+        fieldnames = list(records[0].keys()) if records else list(FIELDS)
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        for record in records:
+            writer.writerow({key: ';'.join(map(str, value)) if isinstance(value, list) else value
+                             for key, value in record.items()})
+    return path
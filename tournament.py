@@ -0,0 +1,152 @@
+"""
+TOURNAMENT
+Plays every pairing of the given agents, in every seat rotation, on every map,
+as headless games spread over a process pool. When there are fewer agents than
+seats, every assignment of seats that gives each agent at least one is played,
+so that no agent holds the extra seats more often than another. An agent with
+several seats counts one game, winning it when its seats hold all the best
+scores, with the mean score of its seats. Each game is seeded from the
+tournament seed and its index, so results do not depend on scheduling.
+Parallel agents in a game share the cores left to its worker, so that the
+pools of all workers together do not use more processes than there are cores,
+and their search pool is shut down after every game.
+
+Usage:
+    python tournament.py MinimaxABAgent,MaxNAgent example_map.txt,four_player_map.txt 5 3 10 42
+    (agents, maps, max rounds, max depth, games per lineup, seed, workers, max think time)
+"""
+import csv
+import itertools
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import config
+from headless import simulate, load_state
+from parallel import SearchPool
+
+
+def get_lineups(algorithms_names, num_of_players):
+    if len(algorithms_names) < num_of_players:
+        return [lineup for lineup in itertools.product(algorithms_names, repeat=num_of_players)
+                if set(lineup) == set(algorithms_names)]
+    lineups = []
+    for group in itertools.combinations(algorithms_names, num_of_players):
+        for shift in range(num_of_players):
+            lineup = group[shift:] + group[:shift]
+            if lineup not in lineups:
+                lineups.append(lineup)
+    return lineups
+
+
+def get_tasks(algorithms_names, map_names, max_rounds, max_depth, max_think_time, games, seed):
+    rng = random.Random(seed)
+    tasks = []
+    for map_name in map_names:
+        num_of_players = load_state(map_name, max_rounds).get_num_of_players()
+        for lineup in get_lineups(algorithms_names, num_of_players):
+            for _ in range(games):
+                tasks.append((lineup, map_name, max_rounds, max_depth, max_think_time, rng.getrandbits(64)))
+    return tasks
+
+
+def init_worker(workers):
+    # cores for the search pool of a parallel agent in this worker
+    config.SEARCH_WORKERS = max(1, (config.SEARCH_WORKERS or os.cpu_count() or 1) // workers)
+
+
+def play_game(task):
+    lineup, map_name, max_rounds, max_depth, max_think_time, game_seed = task
+    # agents start every game with empty tables, so a game depends on its seed only
+    random.seed(game_seed)
+    # atexit does not run in pool workers, a search pool left running would block the exit of this one
+    try:
+        return simulate(lineup, map_name, max_rounds, max_depth, max_think_time)
+    finally:
+        SearchPool.shutdown()
+
+
+def get_table(results, algorithms_names):
+    table = {name: {'games': 0, 'wins': 0, 'draws': 0, 'score': 0, 'moves': 0, 'think_time': 0., 'nodes': 0}
+             for name in algorithms_names}
+    for result in results:
+        scores = sorted(result['scores'].items())
+        best = max(score for _, score in scores)
+        winners = {kind for kind, score in scores if score == best}
+        seats = {}
+        for ordinal, name in enumerate(result['agents']):
+            seats.setdefault(name, set()).add(chr(ord('A') + ordinal))
+        for name, kinds in seats.items():
+            row = table[name]
+            row['games'] += 1
+            row['score'] += sum(result['scores'][kind] for kind in kinds) / len(kinds)
+            if winners <= kinds:
+                row['wins'] += 1
+            elif winners & kinds:
+                row['draws'] += 1
+        for move in result['history']:
+            row = table[move['agent']]
+            row['moves'] += 1
+            row['think_time'] += move['think_time']
+            row['nodes'] += move['nodes']
+    return [{
+        'agent': name,
+        'games': row['games'],
+        'wins': row['wins'],
+        'draws': row['draws'],
+        'mean_score': row['score'] / row['games'] if row['games'] else 0.,
+        'mean_think_time': row['think_time'] / row['moves'] if row['moves'] else 0.,
+        'nodes': row['nodes'],
+        'mean_nodes': row['nodes'] / row['moves'] if row['moves'] else 0.
+    } for name, row in table.items()]
+
+
+def write_table(table, filename=None):
+    if not os.path.exists(config.LOG_FOLDER):
+        os.mkdir(config.LOG_FOLDER)
+    if filename is None:
+        filename = f'TOURNAMENT_{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}.csv'
+    path = os.path.join(config.LOG_FOLDER, filename)
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(table[0].keys()))
+        writer.writeheader()
+        writer.writerows(table)
+    return path
+
+
+def format_table(table):
+    lines = [f'{"agent":<20}{"games":>7}{"wins":>7}{"draws":>7}{"score":>9}{"think[s]":>10}{"nodes/move":>12}']
+    for row in table:
+        lines.append(f'{row["agent"]:<20}{row["games"]:>7}{row["wins"]:>7}{row["draws"]:>7}'
+                     f'{row["mean_score"]:>9.2f}{row["mean_think_time"]:>10.4f}{row["mean_nodes"]:>12.1f}')
+    return '\n'.join(lines)
+
+
+def run_tournament(algorithms, map_names=None, max_rounds=5, max_depth=3, games=1, seed=None, workers=None,
+                   max_think_time=0):
+    algorithms_names = [algo if isinstance(algo, str) else algo.__name__ for algo in algorithms]
+    if map_names is None:
+        map_names = sorted(name for name in os.listdir(config.MAP_FOLDER) if name.endswith('.txt'))
+    tasks = get_tasks(algorithms_names, map_names, max_rounds, max_depth, max_think_time, games, seed)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(workers,)) as executor:
+        results = list(executor.map(play_game, tasks, chunksize=chunksize))
+    return get_table(results, algorithms_names), results
+
+
+if __name__ == '__main__':
+    algorithms_names = sys.argv[1].split(',') if len(sys.argv) > 1 else ['RandomAgent', 'GreedyAgent']
+    map_names = sys.argv[2].split(',') if len(sys.argv) > 2 and sys.argv[2] else None
+    max_rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    max_depth = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+    games = int(sys.argv[5]) if len(sys.argv) > 5 else 1
+    seed = int(sys.argv[6]) if len(sys.argv) > 6 else None
+    workers = int(sys.argv[7]) if len(sys.argv) > 7 else None
+    max_think_time = float(sys.argv[8]) if len(sys.argv) > 8 else 0
+    table, _ = run_tournament(algorithms_names, map_names, max_rounds, max_depth, games, seed, workers,
+                              max_think_time)
+    print(format_table(table))
+    print(f'Results written to {write_table(table)}')
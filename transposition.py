@@ -0,0 +1,49 @@
+"""
+TRANSPOSITION TABLE
+Fixed size table of search results indexed by state Zobrist key.
+Every slot keeps one entry (key, depth, value, flag, action, generation).
+Replacement is depth preferred: an entry is overwritten by a deeper or equally
+deep result, or by anything once it belongs to an older search.
+Probes and hits are counted from the start of the latest search.
+"""
+import config
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TranspositionTable:
+    def __init__(self, size=config.TT_SIZE):
+        self.size = size
+        self.entries = [None] * size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        # probes and hits are counted per search
+        self.generation += 1
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        # entries of a previous game are of no use in the next one
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key):
+        self.probes += 1
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, value, flag, action):
+        idx = key % self.size
+        entry = self.entries[idx]
+        if entry is None or entry[5] != self.generation or depth >= entry[1]:
+            self.entries[idx] = (key, depth, value, flag, action, self.generation)